@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+from datetime import timedelta
 from django.db.models import BigAutoField
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -47,7 +48,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'bangazonapi.authentication.CustomerTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -135,6 +136,55 @@ APPEND_SLASH = False
 MEDIA_ROOT = 'media'
 MEDIA_URL = '/media/'
 
+# Uploads are streamed to temporary files and resized by this many processes
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+IMAGE_VARIANT_WORKERS = int(os.getenv("BANGAZON_IMAGE_WORKERS", "2"))
+
+# New products are copied into followers' feeds by FEED_FANOUT_WORKERS
+# background threads, FEED_FANOUT_BATCH_SIZE followers per statement. Sellers
+# with more than FEED_FANOUT_MAX_FOLLOWERS followers are read from the product
+# table instead. Feeds keep their newest FEED_MAX_ENTRIES products.
+FEED_FANOUT_WORKERS = int(os.getenv("BANGAZON_FEED_WORKERS", "2"))
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv("BANGAZON_FEED_MAX_FOLLOWERS", "10000"))
+FEED_MAX_ENTRIES = 500
+
+# Rows inserted per transaction by the bulk product import
+PRODUCT_IMPORT_CHUNK_SIZE = int(os.getenv("BANGAZON_IMPORT_CHUNK_SIZE", "1000"))
+PRODUCT_IMPORT_MAX_CHUNK_SIZE = 5000
+
+# Attempts at a checkout that keeps hitting serialization failures or deadlocks
+CHECKOUT_MAX_ATTEMPTS = 5
+
+# How long reserved cart items hold their stock
+STOCK_RESERVATION_TTL = timedelta(minutes=int(os.getenv("BANGAZON_RESERVATION_MINUTES", "15")))
+
+# Open orders with no cart activity for this long are removed by sweep_carts
+OPEN_ORDER_MAX_AGE = timedelta(days=int(os.getenv("BANGAZON_OPEN_ORDER_DAYS", "30")))
+
+# Rows fetched per round trip by the streaming catalog export
+PRODUCT_EXPORT_CHUNK_SIZE = int(os.getenv("BANGAZON_EXPORT_CHUNK_SIZE", "2000"))
+
+# Customers-also-bought matrix written by build_copurchase and memory-mapped
+# by every worker. Orders paid since the last build are logged next to it.
+COPURCHASE_PATH = os.getenv(
+    "BANGAZON_COPURCHASE_PATH", os.path.join(BASE_DIR, 'data', 'copurchase.bin'))
+COPURCHASE_MAX_NEIGHBORS = 100
+
+# Ratings are ranked by a Bayesian average that starts every product off with
+# RATING_PRIOR_WEIGHT ratings of RATING_PRIOR_MEAN. Leaderboards keep the best
+# LEADERBOARD_SIZE rated products of each category and of the whole catalog.
+RATING_PRIOR_MEAN = 3.0
+RATING_PRIOR_WEIGHT = 5
+LEADERBOARD_SIZE = 50
+
+# Most recent recommendations listed in each direction on GET /profile, and
+# the most a client can ask for with ?recommendation_limit=
+PROFILE_RECOMMENDATION_LIMIT = 50
+PROFILE_MAX_RECOMMENDATION_LIMIT = 200
+
 STATIC_URL = '/static/'
 STATIC_ROOT = f"${BASE_DIR}/static"
 SITE_ID = 1
@@ -153,3 +203,51 @@ DATABASES = {
         'PORT': os.getenv("BANGAZON_DBPORT", "5432"),
     }
 }
+
+
+# Caches
+# The catalog cache holds serialized product and category responses. Pick the
+# backend with BANGAZON_CATALOG_CACHE: locmem (per-process LRU), file, redis
+# or memcached. The last two are shared by every worker.
+CATALOG_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+
+CATALOG_CACHE = os.getenv("BANGAZON_CATALOG_CACHE", "locmem")
+
+# The auth cache maps API tokens to their user and customer, chosen the same
+# way with BANGAZON_AUTH_CACHE. Entries are dropped when a token, user or
+# customer changes, but only in the backend the change was made through.
+# A per-process backend leaves other workers accepting a revoked token until
+# their entry expires, so it defaults to a 5 second timeout instead of 60.
+AUTH_CACHE = os.getenv("BANGAZON_AUTH_CACHE", "locmem")
+AUTH_CACHE_SHARED = AUTH_CACHE in ('file', 'redis', 'memcached')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': CATALOG_CACHE_BACKENDS[CATALOG_CACHE],
+        'LOCATION': os.getenv("BANGAZON_CATALOG_CACHE_LOCATION", "bangazon-catalog"),
+        'TIMEOUT': int(os.getenv("BANGAZON_CATALOG_CACHE_TIMEOUT", "300")),
+    },
+    'auth': {
+        'BACKEND': CATALOG_CACHE_BACKENDS[AUTH_CACHE],
+        'LOCATION': os.getenv("BANGAZON_AUTH_CACHE_LOCATION", "bangazon-auth"),
+        'TIMEOUT': int(os.getenv("BANGAZON_AUTH_CACHE_TIMEOUT", "60" if AUTH_CACHE_SHARED else "5")),
+    },
+}
+
+if CATALOG_CACHE in ('locmem', 'file'):
+    CACHES['catalog']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv("BANGAZON_CATALOG_CACHE_ENTRIES", "5000")),
+    }
+
+if AUTH_CACHE in ('locmem', 'file'):
+    CACHES['auth']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv("BANGAZON_AUTH_CACHE_ENTRIES", "10000")),
+    }
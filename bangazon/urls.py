@@ -8,7 +8,7 @@ from rest_framework.authtoken.views import obtain_auth_token
 from bangazonapi.views import (
     Products, ProductCategories, Orders,
     Payments, Cart, Profile, Users, LineItems,
-    Customers, register_user, login_user
+    Customers, register_user, login_user, cache_stats
 )
 
 # pylint: disable=invalid-name
@@ -29,6 +29,7 @@ router.register(r'profile', Profile, 'profile')
 urlpatterns = [
     path('register', register_user),
     path('login', login_user),
+    path('cachestats', cache_stats),
     path('', include(router.urls)),
     path('api-token-auth', obtain_auth_token),
     path('api-auth', include('rest_framework.urls', namespace='rest_framework')),
@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BangazonapiConfig(AppConfig):
     name = 'bangazonapi'
+
+    def ready(self):
+        # Importing these modules connects their signal receivers
+        from . import authentication, cache, feed, search  # pylint: disable=unused-import
+        post_migrate.connect(search.create_search_index, sender=self)
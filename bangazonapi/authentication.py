@@ -0,0 +1,105 @@
+"""Token authentication that also resolves the caller's customer
+
+The token, its user and the user's customer are loaded with one joined
+query and kept in the `auth` cache, keyed by token, until the cache's
+timeout. Entries are dropped whenever the token, user or customer behind
+them is saved or deleted. With a shared backend that makes logging out or
+deactivating a user take effect right away; the default local memory
+backend is per process, so other workers notice within its few seconds
+timeout.
+
+Views read the customer from `request.customer`, which is None for
+anonymous requests and for users without a customer profile.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from bangazonapi.models import Customer
+
+
+CACHE_KEY_PREFIX = 'auth:token:'
+
+
+def auth_cache():
+    return caches['auth']
+
+
+def cache_key(token_key):
+    return CACHE_KEY_PREFIX + token_key
+
+
+def load_caller(token_key):
+    """Token, user and customer for a token key in a single query
+
+    Returns:
+        tuple -- (user, token, customer), with customer None if the user has none
+
+    Raises:
+        Token.DoesNotExist -- If there is no such token
+    """
+    token = Token.objects.select_related('user', 'user__customer').get(key=token_key)
+    try:
+        customer = token.user.customer
+    except Customer.DoesNotExist:
+        customer = None
+    return token.user, token, customer
+
+
+def forget_tokens(token_keys):
+    """Drop cached callers once the surrounding transaction commits"""
+    keys = [cache_key(token_key) for token_key in token_keys]
+    if keys:
+        transaction.on_commit(lambda: auth_cache().delete_many(keys))
+
+
+class CustomerTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that sets `request.customer` and caches the lookup"""
+
+    def authenticate(self, request):
+        request.customer = None
+        credentials = super().authenticate(request)
+        if credentials is not None:
+            user, token = credentials
+            request.customer = token.customer
+        return credentials
+
+    def authenticate_credentials(self, key):
+        caller = auth_cache().get(cache_key(key))
+        if caller is None:
+            try:
+                caller = load_caller(key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            auth_cache().set(cache_key(key), caller)
+
+        user, token, customer = caller
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        token.customer = customer
+        return user, token
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        forget_tokens(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def customer_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        forget_tokens(Token.objects.filter(user_id=instance.user_id).values_list('key', flat=True))
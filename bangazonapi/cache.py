@@ -0,0 +1,216 @@
+"""Server-side response cache for catalog reads
+
+Serialized responses are stored in the `catalog` cache under a key built
+from the request path and its normalized query parameters. Each entry is
+stored along with the version every tag it depends on (product, category
+or a whole list) had before the database was read. Invalidating a
+tag gives it a new version, so any entry holding the old one is treated as
+stale and dropped the next time it is read, including entries built from
+reads that raced with the invalidation. The versions and the hit/miss
+counters live in the same cache backend, which keeps both correct when the
+backend is shared by several workers.
+"""
+import hashlib
+import uuid
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.http import urlencode
+from bangazonapi.models import Product, ProductCategory
+from bangazonapi.models.product import products_bulk_created
+from bangazonapi.models.productcategory import PATH_SEPARATOR
+from bangazonapi.models.productstats import stats_changed
+
+
+PRODUCT_LIST_TAG = 'product-list'
+CATEGORY_LIST_TAG = 'category-list'
+
+
+def product_tag(product_id):
+    return f'product:{product_id}'
+
+
+def category_tag(category_id):
+    return f'category:{category_id}'
+
+
+def category_path_tags(paths):
+    """Tags for every category along the given materialized paths
+
+    A category's cached lists include its subcategories' products, so a
+    change under a category has to reach all of its ancestors too.
+    """
+    return {
+        category_tag(part)
+        for path in paths if path
+        for part in path.split(PATH_SEPARATOR) if part
+    }
+
+
+class CatalogCache:
+    """Tag-invalidated cache of serialized API responses"""
+
+    key_prefix = 'catalog:response:'
+    tag_prefix = 'catalog:tag:'
+    counter_prefix = 'catalog:counter:'
+    counters = ('hits', 'misses', 'stale', 'invalidations')
+
+    def __init__(self, alias='catalog'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key_for(self, request):
+        """Cache key for a request, independent of query parameter order"""
+        params = sorted(
+            (name, value)
+            for name, values in request.query_params.lists()
+            for value in values
+        )
+        raw = f'{request.path}?{urlencode(params)}'
+        return self.key_prefix + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, request):
+        """Cached response data for the request, or None on a miss"""
+        key = self.key_for(request)
+        entry = self.cache.get(key)
+
+        if entry is None:
+            self.count('misses')
+            return None
+
+        current = self.cache.get_many([self.tag_prefix + tag for tag in entry['tags']])
+        for tag, version in entry['tags'].items():
+            if current.get(self.tag_prefix + tag) != version:
+                self.cache.delete(key)
+                self.count('stale')
+                self.count('misses')
+                return None
+
+        self.count('hits')
+        return entry['data']
+
+    def set(self, request, data, versions):
+        """Store response data along with the tag versions it was built under
+
+        Arguments:
+            versions {dict} -- Result of tag_versions(), taken before the
+                database was read so a concurrent invalidation marks the
+                entry stale instead of being missed
+        """
+        entry = {'data': data, 'tags': versions}
+        self.cache.set(self.key_for(request), entry)
+
+    def tag_versions(self, *tags):
+        """Current version of each tag, to pass to set() once the response is built"""
+        keys = [self.tag_prefix + tag for tag in set(tags)]
+        versions = self.cache.get_many(keys)
+
+        for key in keys:
+            if key not in versions:
+                # Another worker may create the version first; keep theirs
+                self.cache.add(key, uuid.uuid4().hex, timeout=None)
+                versions[key] = self.cache.get(key)
+
+        return {key[len(self.tag_prefix):]: version for key, version in versions.items()}
+
+    def invalidate(self, *tags):
+        """Make every entry that depends on any of the tags stale"""
+        self.cache.set_many(
+            {self.tag_prefix + tag: uuid.uuid4().hex for tag in tags}, timeout=None)
+        self.count('invalidations', len(tags))
+
+    def invalidate_on_commit(self, *tags):
+        """Invalidate once the surrounding transaction commits
+
+        Invalidating earlier would let a concurrent read cache data from
+        before the commit under the new tag versions.
+        """
+        transaction.on_commit(lambda: self.invalidate(*tags))
+
+    def count(self, counter, amount=1):
+        key = self.counter_prefix + counter
+        try:
+            self.cache.incr(key, amount)
+        except ValueError:
+            # First count since the cache was emptied; another worker may add it first
+            if not self.cache.add(key, amount, timeout=None):
+                self.cache.incr(key, amount)
+
+    def stats(self):
+        values = self.cache.get_many([self.counter_prefix + counter for counter in self.counters])
+        stats = {counter: values.get(self.counter_prefix + counter, 0) for counter in self.counters}
+        stats['backend'] = self.cache.__class__.__name__
+        return stats
+
+
+catalog_cache = CatalogCache()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    tags = {
+        PRODUCT_LIST_TAG,
+        product_tag(instance.pk),
+        category_tag(instance.category_id),
+    }
+
+    # A product that moved also leaves its old category
+    category_ids = {instance.category_id}
+    previous = getattr(instance, '_previous_category_id', None)
+    if previous is not None:
+        category_ids.add(previous)
+
+    paths = ProductCategory.objects.filter(
+        pk__in=category_ids).values_list('path', flat=True)
+    tags.update(category_path_tags(paths))
+
+    catalog_cache.invalidate_on_commit(*tags)
+
+
+@receiver(products_bulk_created)
+def products_imported(sender, products, **kwargs):
+    category_ids = {product.category_id for product in products}
+    paths = ProductCategory.objects.filter(
+        pk__in=category_ids).values_list('path', flat=True)
+
+    tags = {PRODUCT_LIST_TAG}
+    tags.update(category_tag(category_id) for category_id in category_ids)
+    tags.update(category_path_tags(paths))
+
+    catalog_cache.invalidate_on_commit(*tags)
+
+
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def category_changed(sender, instance, **kwargs):
+    tags = category_path_tags([instance.path, getattr(instance, '_previous_path', '')])
+    catalog_cache.invalidate_on_commit(
+        CATEGORY_LIST_TAG, PRODUCT_LIST_TAG, category_tag(instance.pk), *tags)
+
+
+def invalidate_products(product_ids):
+    """Invalidate cached responses showing any of the products
+
+    For changes that bypass product saves, such as stock reservations.
+    """
+    placements = Product.objects.filter(pk__in=set(product_ids)).values(
+        'pk', 'category_id', 'category__path')
+
+    tags = {PRODUCT_LIST_TAG}
+    tags.update(product_tag(product_id) for product_id in product_ids)
+    for placement in placements:
+        tags.add(category_tag(placement['category_id']))
+        tags.update(category_path_tags([placement['category__path']]))
+
+    catalog_cache.invalidate_on_commit(*tags)
+
+
+@receiver(stats_changed)
+def product_stats_changed(sender, product_id, **kwargs):
+    """Line item and rating changes reach the cache through their stats"""
+    invalidate_products([product_id])
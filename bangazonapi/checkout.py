@@ -0,0 +1,164 @@
+"""Paying for an order and taking its items out of stock
+
+Checkout runs in a single transaction. The order row and then every
+product on it are locked with SELECT ... FOR UPDATE, products in id order
+so that two checkouts sharing products always lock them in the same order
+and cannot deadlock each other. Stock is only decremented once every
+product is known to have enough, so a short order changes nothing.
+
+Units held by other orders' active reservations do not count as in stock.
+A cart can reserve its own units for STOCK_RESERVATION_TTL, which goes
+through the same locking.
+"""
+import random
+import time
+from functools import partial
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.utils import timezone
+from bangazonapi.cache import invalidate_products
+from bangazonapi.copurchase import record_order
+from bangazonapi.models import (
+    Order, OrderProduct, Payment, Product, ProductStats, StockReservation
+)
+
+
+# PostgreSQL serialization_failure and deadlock_detected
+RETRYABLE_SQLSTATES = ('40001', '40P01')
+
+
+class OutOfStock(Exception):
+    """Raised when an order asks for more units than are in stock"""
+
+    def __init__(self, shortages):
+        super().__init__('Not enough stock to complete the order')
+        # Product id mapped to the number of units still available
+        self.shortages = shortages
+
+
+def is_retryable(error):
+    """Whether a database error is a transient conflict worth retrying"""
+    cause = error.__cause__
+    code = getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)
+    return code in RETRYABLE_SQLSTATES
+
+
+def checkout(order_id, customer, payment_type_id):
+    """Pay for a customer's order, retrying transient lock conflicts
+
+    Raises:
+        Order.DoesNotExist -- If the customer has no such order
+        Payment.DoesNotExist -- If the customer has no such payment type
+        OutOfStock -- If a product on the order does not have enough stock
+    """
+    attempts = settings.CHECKOUT_MAX_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        try:
+            return pay_for_order(order_id, customer, payment_type_id)
+        except OperationalError as ex:
+            if attempt == attempts or not is_retryable(ex):
+                raise
+            # Back off with jitter so the conflicting checkouts spread out
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+
+def lock_stock(order_id, wanted):
+    """Lock the wanted products in id order and check that enough is available
+
+    Arguments:
+        order_id {int} -- Order the units are for; its own reservations are available to it
+        wanted {dict} -- Product id mapped to the number of units needed
+
+    Raises:
+        OutOfStock -- If any product has fewer units available than wanted
+    """
+    in_stock = dict(
+        Product.objects.select_for_update().filter(pk__in=wanted)
+        .order_by('pk').values_list('pk', 'quantity')
+    )
+    held = dict(
+        StockReservation.objects.active().filter(product_id__in=wanted)
+        .exclude(order_id=order_id).order_by().values('product')
+        .annotate(total=Sum('quantity')).values_list('product', 'total')
+    )
+
+    available = {
+        product_id: in_stock.get(product_id, 0) - held.get(product_id, 0)
+        for product_id in wanted
+    }
+    shortages = {
+        product_id: max(available[product_id], 0)
+        for product_id, quantity in wanted.items()
+        if available[product_id] < quantity
+    }
+    if shortages:
+        raise OutOfStock(shortages)
+
+
+@transaction.atomic
+def reserve_stock(order_id, product_ids):
+    """Hold the units of the given products on an open order for a while
+
+    Each reservation covers the product's full quantity on the order and
+    expires STOCK_RESERVATION_TTL from now.
+
+    Raises:
+        OutOfStock -- If the units are not available to reserve
+    """
+    wanted = dict(
+        OrderProduct.objects.filter(order_id=order_id, product_id__in=product_ids)
+        .values_list('product_id', 'quantity')
+    )
+    lock_stock(order_id, wanted)
+
+    expires_at = timezone.now() + settings.STOCK_RESERVATION_TTL
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(order_id=order_id, product_id=product_id,
+                             quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in wanted.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['order', 'product'],
+        update_fields=['quantity', 'expires_at'],
+    )
+    invalidate_products(wanted)
+
+
+@transaction.atomic
+def pay_for_order(order_id, customer, payment_type_id):
+    order = Order.objects.select_for_update().get(pk=order_id, customer=customer)
+    try:
+        payment_type = Payment.objects.get(pk=int(payment_type_id), customer=customer)
+    except (TypeError, ValueError):
+        raise Payment.DoesNotExist('Payment type not found')
+
+    if order.payment_type_id is None:
+        wanted = dict(OrderProduct.objects.filter(order=order).values_list('product_id', 'quantity'))
+
+        lock_stock(order.pk, wanted)
+
+        for product_id in sorted(wanted):
+            Product.objects.filter(pk=product_id).update(
+                quantity=F('quantity') - wanted[product_id])
+
+        # Line items keep the price they were added at; any without one are
+        # charged the current price. The totals are frozen once paid.
+        OrderProduct.objects.filter(order=order, unit_price__isnull=True).update(
+            unit_price=Subquery(Product.objects.filter(pk=OuterRef('product')).values('price')))
+        Order.objects.filter(pk=order.pk).refresh_totals()
+        order.refresh_from_db(fields=['item_count', 'subtotal'])
+
+        order.payment_type = payment_type
+        order.save()
+        order.reservations.all().delete()
+        # Recording the sale also invalidates the cached products whose stock changed
+        ProductStats.objects.record_sale(order)
+        transaction.on_commit(partial(record_order, order.pk, list(wanted)))
+
+    else:
+        order.payment_type = payment_type
+        order.save()
+
+    return order
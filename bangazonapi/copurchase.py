@@ -0,0 +1,267 @@
+"""Customers-also-bought lookups from a product co-purchase matrix
+
+The matrix counts, for every pair of products, how many paid orders
+contained both. build_copurchase writes it to COPURCHASE_PATH as a sparse
+row-compressed file: a header, then row offsets, column product ids and
+counts as native 64-bit integers. Row `i` holds product `i`'s most often
+co-purchased products, highest count first, up to COPURCHASE_MAX_NEIGHBORS.
+
+Every worker memory-maps the same file, so the operating system keeps a
+single copy in its page cache and a lookup is a slice of that mapping.
+Orders paid after the build are appended to a log next to the matrix as
+(order id, product id, product id) entries; workers read the new part of
+the log at most once per CHECK_INTERVAL and add it to the counts in
+memory. Neither lookups nor updates touch the database.
+"""
+import array
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import groupby, permutations
+from django.conf import settings
+
+
+MAGIC = b'BZCP'
+VERSION = 1
+HEADER = struct.Struct('<4sIqq')
+# One delta log entry: the paid order, a product and a product bought along with it
+ENTRY = struct.Struct('=qqq')
+ITEM_SIZE = struct.calcsize('q')
+
+EMPTY_ROW = memoryview(array.array('q'))
+
+# Seconds between checks for a rebuilt matrix or new log entries
+CHECK_INTERVAL = 1.0
+
+
+def matrix_path():
+    return settings.COPURCHASE_PATH
+
+
+def log_path(path=None):
+    return f'{path or matrix_path()}.log'
+
+
+def count_pairs(line_items):
+    """Co-purchase counts from (order id, product id) pairs sorted by order
+
+    Returns:
+        dict -- Product id mapped to a Counter of co-purchased product ids
+    """
+    pairs = defaultdict(Counter)
+    for _, items in groupby(line_items, key=lambda item: item[0]):
+        product_ids = sorted({product_id for _, product_id in items})
+        for product_id, other_id in permutations(product_ids, 2):
+            pairs[product_id][other_id] += 1
+    return pairs
+
+
+def read_log(path=None):
+    """Every complete (order id, product id, product id) entry in a delta log"""
+    try:
+        with open(log_path(path), 'rb') as log:
+            entries = log.read()
+    except FileNotFoundError:
+        return
+    yield from ENTRY.iter_unpack(entries[:len(entries) - len(entries) % ENTRY.size])
+
+
+def discount_logged(pairs, counted_order_ids, path=None):
+    """Take orders that are both counted and in the delta log out of the counts
+
+    Workers add the log on top of the matrix, so an order paid while the
+    line items were being read would otherwise count twice.
+
+    Arguments:
+        pairs {dict} -- Counts from count_pairs(), changed in place
+        counted_order_ids {array} -- Sorted ids of the orders the counts cover
+
+    Returns:
+        int -- Number of orders taken out
+    """
+    def counted(order_id):
+        at = bisect.bisect_left(counted_order_ids, order_id)
+        return at < len(counted_order_ids) and counted_order_ids[at] == order_id
+
+    discounted = set()
+    for order_id, product_id, other_id in read_log(path):
+        if counted(order_id):
+            pairs[product_id][other_id] -= 1
+            discounted.add(order_id)
+    return len(discounted)
+
+
+def write_matrix(pairs, max_neighbors, path=None):
+    """Write co-purchase counts to the matrix file, replacing it atomically
+
+    Returns:
+        int -- Number of stored product pairs
+    """
+    path = path or matrix_path()
+    size = max(pairs, default=-1) + 1
+    indptr = array.array('q', [0])
+    indices = array.array('q')
+    data = array.array('q')
+
+    for product_id in range(size):
+        row = {other_id: count
+               for other_id, count in pairs.get(product_id, {}).items() if count > 0}
+        if row:
+            ranked = sorted(row.items(), key=lambda item: (-item[1], item[0]))[:max_neighbors]
+            indices.extend(other_id for other_id, _ in ranked)
+            data.extend(count for _, count in ranked)
+        indptr.append(len(indices))
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as matrix_file:
+        matrix_file.write(HEADER.pack(MAGIC, VERSION, size, len(indices)))
+        indptr.tofile(matrix_file)
+        indices.tofile(matrix_file)
+        data.tofile(matrix_file)
+    os.replace(temporary_path, path)
+
+    return len(indices)
+
+
+def record_order(order_id, product_ids, path=None):
+    """Append the product pairs of a newly paid order to the delta log
+
+    The log is written with a single append, so concurrent workers do not
+    interleave their entries. A failed write only loses the order until
+    the next build_copurchase.
+    """
+    product_ids = sorted(set(product_ids))
+    if len(product_ids) < 2:
+        return
+
+    entries = b''.join(ENTRY.pack(order_id, *pair) for pair in permutations(product_ids, 2))
+    path = log_path(path)
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        log = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            written = 0
+            while written < len(entries):
+                written += os.write(log, entries[written:])
+        finally:
+            os.close(log)
+    except OSError:
+        pass
+
+
+class CoPurchaseMatrix:
+    """Read-only view of a matrix file through a shared memory map"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as matrix_file:
+            self.map = mmap.mmap(matrix_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.size, stored = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a co-purchase matrix')
+
+        view = memoryview(self.map)
+        start = HEADER.size
+        self.indptr = view[start:start + (self.size + 1) * ITEM_SIZE].cast('q')
+        start += (self.size + 1) * ITEM_SIZE
+        self.indices = view[start:start + stored * ITEM_SIZE].cast('q')
+        start += stored * ITEM_SIZE
+        self.data = view[start:start + stored * ITEM_SIZE].cast('q')
+
+    def row(self, product_id):
+        """Co-purchased product ids and counts of a product, highest count first"""
+        if not 0 <= product_id < self.size:
+            return EMPTY_ROW, EMPTY_ROW
+        begin, end = self.indptr[product_id], self.indptr[product_id + 1]
+        return self.indices[begin:end], self.data[begin:end]
+
+
+class CoPurchaseIndex:
+    """Per-process access to the shared matrix plus the orders paid since it was built"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.matrix = None
+        self.matrix_stamp = None
+        self.deltas = defaultdict(Counter)
+        self.log_inode = None
+        self.log_offset = 0
+        self.checked_at = None
+
+    def refresh(self, force=False):
+        """Pick up a rebuilt matrix and new log entries, at most once per CHECK_INTERVAL"""
+        now = time.monotonic()
+        if not force and self.checked_at is not None and now - self.checked_at < CHECK_INTERVAL:
+            return
+
+        with self.lock:
+            self.checked_at = now
+            self.load_matrix()
+            self.read_log()
+
+    def load_matrix(self):
+        path = self.path or matrix_path()
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.matrix, self.matrix_stamp = None, None
+            return
+
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp != self.matrix_stamp:
+            self.matrix, self.matrix_stamp = CoPurchaseMatrix(path), stamp
+
+    def read_log(self):
+        try:
+            log = open(log_path(self.path), 'rb')
+        except FileNotFoundError:
+            self.reset_log(None)
+            return
+
+        with log:
+            stat = os.fstat(log.fileno())
+            # A build starts a new log; its entries are in the new matrix
+            if stat.st_ino != self.log_inode:
+                self.reset_log(stat.st_ino)
+
+            end = stat.st_size - (stat.st_size - self.log_offset) % ENTRY.size
+            if end > self.log_offset:
+                log.seek(self.log_offset)
+                for _, product_id, other_id in ENTRY.iter_unpack(log.read(end - self.log_offset)):
+                    self.deltas[product_id][other_id] += 1
+                self.log_offset = end
+
+    def reset_log(self, inode):
+        self.deltas.clear()
+        self.log_inode = inode
+        self.log_offset = 0
+
+    def related(self, product_id, limit):
+        """Products most often bought along with a product
+
+        Returns:
+            list -- (product id, number of orders) pairs, highest count first
+        """
+        self.refresh()
+
+        with self.lock:
+            indices, data = self.matrix.row(product_id) if self.matrix else (EMPTY_ROW, EMPTY_ROW)
+            delta = self.deltas.get(product_id)
+
+            if not delta:
+                return list(zip(indices[:limit].tolist(), data[:limit].tolist()))
+
+            counts = Counter(dict(zip(indices.tolist(), data.tolist())))
+            counts.update(delta)
+
+        return heapq.nlargest(limit, counts.items(), key=lambda item: (item[1], -item[0]))
+
+
+copurchase_index = CoPurchaseIndex()
@@ -0,0 +1,49 @@
+"""Streaming product catalog export as NDJSON or CSV
+
+Rows are read through a server-side cursor and encoded one at a time, so
+the response starts as soon as the first chunk is fetched and memory use
+does not grow with the size of the catalog.
+"""
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+EXPORT_FIELDS = (
+    'id', 'name', 'price', 'number_sold', 'average_rating', 'description',
+    'quantity', 'available', 'created_date', 'location', 'category_id', 'customer_id',
+)
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class Echo:
+    """File-like object whose write returns the value instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(products, chunk_size):
+    """Product rows as dicts of EXPORT_FIELDS, fetched `chunk_size` at a time"""
+    return products.order_by('id').values(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def iter_ndjson(rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+EXPORT_WRITERS = {
+    'ndjson': iter_ndjson,
+    'csv': iter_csv,
+}
@@ -0,0 +1,189 @@
+"""New-products feeds for customers following sellers
+
+Feeds are filled on write: once a product is committed, a background thread
+adds a FeedEntry for each of the seller's followers, FEED_FANOUT_BATCH_SIZE
+followers per INSERT, and trims those followers' feeds back to their newest
+FEED_MAX_ENTRIES products. Reading a page of a feed is a range scan of the
+(customer, product) index.
+
+Sellers with more than FEED_FANOUT_MAX_FOLLOWERS followers are not fanned
+out, since one product would mean that many inserts. Their products are
+read from the (customer, id) product index and merged in when a follower
+reads their feed. rebuild_feeds recomputes follower counts and every feed,
+for instance after a seller drops back under the limit.
+"""
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from bangazonapi.models import Customer, Favorite, FeedEntry, Product
+from bangazonapi.models.product import products_bulk_created
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.FEED_FANOUT_WORKERS)
+        return _pool
+
+
+def is_pulled(seller_id):
+    """Whether a seller has too many followers for their products to be fanned out"""
+    return Customer.objects.filter(
+        pk=seller_id, follower_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS).exists()
+
+
+def read_feed(customer, before=None, limit=20):
+    """Product ids on one page of a customer's feed, newest first
+
+    Arguments:
+        before {int} -- Only products with a lower id, to continue from a previous page
+        limit {int} -- Page size; one extra id is returned when there are more
+
+    Returns:
+        list -- Up to limit + 1 product ids
+    """
+    entries = FeedEntry.objects.filter(customer=customer)
+    if before is not None:
+        entries = entries.filter(product_id__lt=before)
+    product_ids = list(
+        entries.order_by('-product_id').values_list('product_id', flat=True)[:limit + 1])
+
+    pulled = list(Favorite.objects.filter(
+        customer=customer, seller__follower_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('seller_id', flat=True))
+
+    if pulled:
+        products = Product.objects.filter(customer_id__in=pulled)
+        if before is not None:
+            products = products.filter(pk__lt=before)
+        newest = products.order_by('-id').values_list('id', flat=True)[:limit + 1]
+        product_ids = sorted(set(product_ids).union(newest), reverse=True)[:limit + 1]
+
+    return product_ids
+
+
+def trim_feeds(customer_ids):
+    """Delete all but the newest FEED_MAX_ENTRIES entries of the given feeds in one statement"""
+    if not customer_ids:
+        return
+
+    quote = connection.ops.quote_name
+    table = quote(FeedEntry._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(customer_ids))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {quote("id")} IN ('
+            f'SELECT {quote("id")} FROM ('
+            f'SELECT {quote("id")}, ROW_NUMBER() OVER (PARTITION BY {quote("customer_id")} '
+            f'ORDER BY {quote("product_id")} DESC) AS position '
+            f'FROM {table} WHERE {quote("customer_id")} IN ({placeholders})'
+            f') ranked WHERE position > %s)',
+            [*customer_ids, settings.FEED_MAX_ENTRIES])
+
+
+def write_entries(follower_ids, seller_id, product_ids):
+    """Add a seller's products to a batch of followers' feeds and trim them"""
+    with transaction.atomic():
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(customer_id=follower_id, seller_id=seller_id, product_id=product_id)
+                for follower_id in follower_ids if follower_id != seller_id
+                for product_id in product_ids
+            ],
+            ignore_conflicts=True,
+        )
+        trim_feeds(follower_ids)
+
+
+def fan_out_to(followers, seller_id, product_ids):
+    """Write a seller's products to the feeds of the given followers, batch by batch"""
+    batch = []
+    for follower_id in followers:
+        batch.append(follower_id)
+        if len(batch) >= settings.FEED_FANOUT_BATCH_SIZE:
+            write_entries(batch, seller_id, product_ids)
+            batch = []
+    if batch:
+        write_entries(batch, seller_id, product_ids)
+
+
+def fan_out(products):
+    """Add new products to their sellers' followers' feeds; runs in a pool thread
+
+    Arguments:
+        products {list} -- (product id, seller id) pairs
+    """
+    try:
+        by_seller = defaultdict(list)
+        for product_id, seller_id in products:
+            by_seller[seller_id].append(product_id)
+
+        for seller_id, product_ids in by_seller.items():
+            if is_pulled(seller_id):
+                continue
+
+            followers = (
+                Favorite.objects.filter(seller_id=seller_id).order_by('customer_id')
+                .values_list('customer_id', flat=True).distinct()
+            )
+            fan_out_to(followers.iterator(), seller_id, product_ids)
+    finally:
+        connection.close()
+
+
+def backfill(follower_ids, seller_id):
+    """Give followers a seller's newest products, as when they start following"""
+    if is_pulled(seller_id):
+        return
+
+    product_ids = list(
+        Product.objects.filter(customer_id=seller_id).order_by('-id')
+        .values_list('id', flat=True)[:settings.FEED_MAX_ENTRIES]
+    )
+    if product_ids:
+        fan_out_to(follower_ids, seller_id, product_ids)
+
+
+def schedule_fan_out(products):
+    """Queue feed fan-out for products once they are committed"""
+    rows = [(product.pk, product.customer_id) for product in products]
+    transaction.on_commit(lambda: get_pool().submit(fan_out, rows))
+
+
+@receiver(post_save, sender=Product)
+def product_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        schedule_fan_out([instance])
+
+
+@receiver(products_bulk_created)
+def products_imported(sender, products, **kwargs):
+    schedule_fan_out(products)
+
+
+@receiver(post_save, sender=Favorite)
+def seller_followed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Customer.objects.filter(pk=instance.seller_id).update(follower_count=F('follower_count') + 1)
+        backfill([instance.customer_id], instance.seller_id)
+
+
+@receiver(post_delete, sender=Favorite)
+def seller_unfollowed(sender, instance, **kwargs):
+    Customer.objects.filter(pk=instance.seller_id).update(follower_count=F('follower_count') - 1)
+
+    still_following = Favorite.objects.filter(
+        customer_id=instance.customer_id, seller_id=instance.seller_id).exists()
+    if not still_following:
+        FeedEntry.objects.filter(customer_id=instance.customer_id, seller_id=instance.seller_id).delete()
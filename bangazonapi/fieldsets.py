@@ -0,0 +1,111 @@
+"""Sparse fieldsets and explicit expansion for API responses
+
+`?fields=` limits a response to the listed fields and `?expand=` swaps a
+related object's id for the full object. Both take a comma-separated list
+of dotted paths that follow the shape of the response, for example
+`/orders?fields=id,lineitems.product.name&expand=payment_type`.
+
+Serializers opt in with SparseFieldsMixin. Views use field_requested() to
+leave out the joins and annotations behind fields nobody asked for.
+"""
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def requested_paths(request, param):
+    """Dotted paths listed in a query parameter, or None if it was not sent"""
+    if request is None or param not in request.query_params:
+        return None
+
+    return {
+        path.strip()
+        for path in request.query_params[param].split(',')
+        if path.strip()
+    }
+
+
+def names_under(paths, prefix):
+    """Field names one level below `prefix` mentioned in `paths`
+
+    Returns:
+        set -- The names, or None when `prefix` itself is listed in full
+    """
+    names = set()
+    for path in paths:
+        if prefix:
+            if path == prefix:
+                return None
+            if not path.startswith(f'{prefix}.'):
+                continue
+            path = path[len(prefix) + 1:]
+        names.add(path.split('.', 1)[0])
+    return names
+
+
+def field_requested(request, path):
+    """Whether the response to a request will include the field at `path`"""
+    paths = requested_paths(request, FIELDS_PARAM)
+    if paths is None:
+        return True
+
+    return any(
+        requested == path or
+        requested.startswith(f'{path}.') or
+        path.startswith(f'{requested}.')
+        for requested in paths
+    )
+
+
+def field_expanded(request, path):
+    """Whether the client asked to expand the related object at `path`"""
+    return path in (requested_paths(request, EXPAND_PARAM) or ()) and field_requested(request, path)
+
+
+class SparseFieldsMixin:
+    """Serializer mixin honoring the `fields` and `expand` query parameters
+
+    Works at any nesting level, including serializers generated for
+    `depth`: a nested serializer finds its own dotted path from the chain of
+    parent serializers it is bound to.
+
+    `expandable_fields` maps a field name to a callable returning the
+    serializer to use in its place when the field is expanded.
+    """
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request', None)
+        prefix = self.field_path()
+
+        expand = requested_paths(request, EXPAND_PARAM)
+        if expand:
+            for name in names_under(expand, prefix) or ():
+                if name in self.expandable_fields and name in fields:
+                    fields[name] = self.expandable_fields[name]()
+
+        requested = requested_paths(request, FIELDS_PARAM)
+        if requested is not None:
+            names = names_under(requested, prefix)
+            if names is not None:
+                for name in list(fields):
+                    if name not in names:
+                        del fields[name]
+
+        return fields
+
+    def build_nested_field(self, field_name, relation_info, nested_depth):
+        """Let serializers generated for `depth` nesting filter their fields too"""
+        field_class, field_kwargs = super().build_nested_field(
+            field_name, relation_info, nested_depth)
+        return type(field_class.__name__, (SparseFieldsMixin, field_class), {}), field_kwargs
+
+    def field_path(self):
+        """Dotted path of this serializer within the response"""
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(names))
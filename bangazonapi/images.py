@@ -0,0 +1,103 @@
+"""Background generation of resized product images
+
+Uploaded product images are resized into smaller variants in a process
+pool, off the request path. The workers are spawned rather than forked, so
+they never inherit the parent's database connections, and they only deal
+with files on disk; the parent process records the generated paths on the
+product once a job is done.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+from PIL import Image
+
+
+VARIANT_SIZES = {
+    'thumbnail': (150, 150),
+    'medium': (600, 600),
+}
+VARIANT_DIRECTORY = 'products/variants'
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render_variants(source_path, media_root, stem):
+    """Write JPEG and WebP copies of an image at every variant size
+
+    Runs inside a worker process, so it must not touch the database.
+
+    Returns:
+        dict -- Variant name mapped to its path relative to MEDIA_ROOT
+    """
+    output_directory = os.path.join(media_root, VARIANT_DIRECTORY)
+    os.makedirs(output_directory, exist_ok=True)
+
+    variants = {}
+    with Image.open(source_path) as original:
+        image = original.convert('RGB')
+
+        for name, size in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail(size)
+
+            for extension, image_format in (('jpg', 'JPEG'), ('webp', 'WEBP')):
+                relative_path = f'{VARIANT_DIRECTORY}/{stem}-{name}.{extension}'
+                resized.save(os.path.join(media_root, relative_path), image_format, quality=85)
+                key = name if extension == 'jpg' else f'{name}_webp'
+                variants[key] = relative_path
+
+    return variants
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def schedule_variants(product):
+    """Queue variant generation for a product once its image is committed"""
+    if not product.image_path:
+        return
+
+    source_path = product.image_path.path
+    stem = os.path.splitext(os.path.basename(product.image_path.name))[0]
+    product_id = product.pk
+
+    def submit():
+        future = get_pool().submit(
+            render_variants, source_path, os.path.abspath(settings.MEDIA_ROOT), stem)
+        future.add_done_callback(lambda done: store_variants(product_id, done))
+
+    transaction.on_commit(submit)
+
+
+def store_variants(product_id, future):
+    """Record finished variants on the product; runs in a pool callback thread"""
+    # Imported here so worker processes can load this module without Django
+    from bangazonapi.models import Product
+
+    error = future.exception()
+    if error is not None:
+        logger.error("Could not resize the image of product %s", product_id, exc_info=error)
+        return
+
+    try:
+        product = Product.objects.filter(pk=product_id).first()
+        if product is not None:
+            product.image_variants = future.result()
+            product.save(update_fields=['image_variants'])
+    except Exception:
+        logger.exception("Could not record the image variants of product %s", product_id)
+    finally:
+        connection.close()
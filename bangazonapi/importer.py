@@ -0,0 +1,179 @@
+"""Bulk product import from NDJSON or JSON array request bodies
+
+The body is decoded incrementally as it is read from the request stream,
+rows are validated against a category map loaded once up front, and valid
+rows are written with bulk_create in chunks, one transaction per chunk.
+"""
+import codecs
+import json
+import re
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+from bangazonapi.models import Product, ProductCategory
+from bangazonapi.models.product import products_bulk_created
+
+
+READ_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class ProductImportSerializer(serializers.Serializer):
+    """Validates one row of a bulk product import"""
+    name = serializers.CharField(max_length=50)
+    price = serializers.FloatField(min_value=0, max_value=10000)
+    description = serializers.CharField(max_length=255)
+    quantity = serializers.IntegerField(min_value=0)
+    location = serializers.CharField(max_length=50)
+    category_id = serializers.IntegerField()
+
+    def validate_category_id(self, value):
+        if value not in self.context['category_ids']:
+            raise serializers.ValidationError(f'Category {value} does not exist')
+        return value
+
+
+class MalformedRow:
+    """Stands in for a body row that could not be decoded"""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def iter_ndjson(stream):
+    """Yield one decoded object per non-blank line of the stream"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            yield json.loads(line)
+        except ValueError as ex:
+            yield MalformedRow(str(ex))
+
+
+def iter_json_array(stream):
+    """Yield the elements of a top-level JSON array without reading it all
+
+    Raises:
+        ValueError -- If the body is not a well-formed JSON array
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer, position = '', 0
+    exhausted = need_more = False
+    state = 'start'
+
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+
+        if need_more or position == len(buffer):
+            if exhausted:
+                raise ValueError('Unexpected end of JSON array')
+            chunk = stream.read(READ_SIZE)
+            exhausted = not chunk
+            buffer = buffer[position:] + utf8.decode(chunk, final=exhausted)
+            position = 0
+            need_more = False
+            continue
+
+        char = buffer[position]
+
+        if state == 'start':
+            if char != '[':
+                raise ValueError('Expected a JSON array')
+            position += 1
+            state = 'first'
+
+        elif state in ('first', 'after') and char == ']':
+            return
+
+        elif state == 'after':
+            if char != ',':
+                raise ValueError(f'Expected "," or "]" at character {position}')
+            position += 1
+            state = 'value'
+
+        else:
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if exhausted:
+                    raise
+                need_more = True
+                continue
+
+            # A value that runs to the end of the buffer may continue in the next read
+            if end == len(buffer) and not exhausted:
+                need_more = True
+                continue
+
+            position = end
+            state = 'after'
+            yield element
+
+
+class ProductImport:
+    """Validates and inserts a stream of product rows for one seller"""
+
+    def __init__(self, customer, chunk_size):
+        self.customer = customer
+        self.chunk_size = chunk_size
+        self.category_ids = set(ProductCategory.objects.values_list('pk', flat=True))
+        self.validator = ProductImportSerializer(context={'category_ids': self.category_ids})
+        self.created = 0
+        self.errors = []
+
+    def run(self, rows):
+        """Import every row, reporting failures by their position in the body
+
+        Returns:
+            dict -- Counts of created and failed rows with per-row errors
+        """
+        batch = []
+        try:
+            for index, row in enumerate(rows):
+                product = self.validate(index, row)
+                if product is not None:
+                    batch.append((index, product))
+
+                if len(batch) >= self.chunk_size:
+                    self.insert(batch)
+                    batch = []
+        except ValueError as ex:
+            self.errors.append({'row': None, 'errors': {'body': [str(ex)]}})
+
+        if batch:
+            self.insert(batch)
+
+        return {
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+    def validate(self, index, row):
+        if isinstance(row, MalformedRow):
+            self.errors.append({'row': index, 'errors': {'body': [row.message]}})
+            return None
+
+        try:
+            data = self.validator.run_validation(row)
+        except serializers.ValidationError as ex:
+            self.errors.append({'row': index, 'errors': ex.detail})
+            return None
+
+        return Product(customer=self.customer, **data)
+
+    def insert(self, batch):
+        products = [product for _, product in batch]
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create(products)
+                products_bulk_created.send(sender=Product, products=products)
+        except DatabaseError as ex:
+            self.errors.extend(
+                {'row': index, 'errors': {'database': [str(ex)]}} for index, _ in batch)
+            return
+
+        self.created += len(products)
@@ -0,0 +1,141 @@
+"""Run concurrent checkouts against a few contended products and check for overselling"""
+import os
+import tempfile
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.test.utils import override_settings
+from bangazonapi.checkout import OutOfStock, checkout
+from bangazonapi.models import (
+    Customer, Order, OrderProduct, Payment, Product, ProductCategory
+)
+
+
+def attempt_checkout(order):
+    """Check out one order from a worker thread
+
+    Returns:
+        str -- paid, out_of_stock or error
+    """
+    try:
+        checkout(order.pk, order.customer, order.payment_type_id)
+        return 'paid'
+    except OutOfStock:
+        return 'out_of_stock'
+    except DatabaseError:
+        return 'error'
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = ("Benchmark concurrent checkouts of the same products and verify that stock "
+            "never goes below zero. Creates its own data and removes it afterwards, and "
+            "logs its orders' co-purchases to a throwaway file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200,
+                            help="Number of orders checked out concurrently")
+        parser.add_argument('--products', type=int, default=3,
+                            help="Number of products every order contains")
+        parser.add_argument('--stock', type=int, default=100,
+                            help="Starting stock of each product")
+        parser.add_argument('--workers', type=int, default=16,
+                            help="Number of concurrent checkouts")
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        created = {'users': [], 'customers': [], 'payments': [], 'orders': []}
+
+        # Paid orders are appended to the co-purchase log, which would skew
+        # customers-also-bought for real products. Sales stats only touch the
+        # benchmark's own products and are deleted along with them.
+        with tempfile.TemporaryDirectory() as scratch, \
+                override_settings(COPURCHASE_PATH=os.path.join(scratch, 'copurchase.bin')):
+            try:
+                products = self.set_up(run, options, created)
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                    outcomes = Counter(pool.map(attempt_checkout, created['orders']))
+                elapsed = time.perf_counter() - started
+
+                self.report(products, options, outcomes, elapsed)
+
+            finally:
+                self.tear_down(created)
+
+    def set_up(self, run, options, created):
+        category = ProductCategory.objects.create(name=f'Checkout benchmark {run}')
+        created['category'] = category
+
+        seller = self.create_customer(f'bench-{run}-seller', created)
+
+        products = [
+            Product.objects.create(
+                name=f'Benchmark {run} {index}', customer=seller, price=1,
+                description='Checkout benchmark product', quantity=options['stock'],
+                category=category, location='Benchmark')
+            for index in range(options['products'])
+        ]
+        created['products'] = products
+
+        for index in range(options['orders']):
+            customer = self.create_customer(f'bench-{run}-{index}', created)
+            payment = Payment.objects.create(
+                merchant_name='Benchmark', account_number=run, customer=customer,
+                expiration_date='2099-01-01', create_date='2020-01-01')
+            created['payments'].append(payment)
+            order = Order.objects.create(customer=customer, created_date='2020-01-01')
+            OrderProduct.objects.add_to_order(
+                order.pk, {product.pk: 1 for product in products})
+            order.payment_type_id = payment.pk
+            created['orders'].append(order)
+
+        return products
+
+    def create_customer(self, username, created):
+        user = User.objects.create(username=username)
+        customer = Customer.objects.create(user=user, phone_number='', address='')
+        created['users'].append(user)
+        created['customers'].append(customer)
+        return customer
+
+    def report(self, products, options, outcomes, elapsed):
+        remaining = dict(Product.objects.filter(
+            pk__in=[product.pk for product in products]).values_list('pk', 'quantity'))
+        expected = max(options['stock'] - outcomes['paid'], 0)
+
+        self.stdout.write(
+            f"{options['orders']} checkouts in {elapsed:.2f}s "
+            f"({options['orders'] / elapsed:.1f}/s) with {options['workers']} workers: "
+            f"{outcomes['paid']} paid, {outcomes['out_of_stock']} out of stock, "
+            f"{outcomes['error']} failed")
+
+        oversold = {pk: quantity for pk, quantity in remaining.items() if quantity < 0}
+        if oversold:
+            raise CommandError(f"Oversold products: {oversold}")
+
+        if outcomes['paid'] > options['stock'] or set(remaining.values()) != {expected}:
+            raise CommandError(
+                f"Stock does not match paid orders: expected {expected} left, got {remaining}")
+
+        self.stdout.write(self.style.SUCCESS("No product was oversold"))
+
+    def tear_down(self, created):
+        orders = created['orders']
+        OrderProduct.objects.filter(order__in=orders).delete()
+        Order.objects.filter(pk__in=[order.pk for order in orders]).delete()
+
+        for product in created.get('products', []):
+            product.delete()
+        Payment.objects.filter(pk__in=[payment.pk for payment in created['payments']]).delete()
+        if 'category' in created:
+            created['category'].delete()
+
+        Customer.objects.filter(pk__in=[customer.pk for customer in created['customers']]).delete()
+        User.objects.filter(pk__in=[user.pk for user in created['users']]).delete()
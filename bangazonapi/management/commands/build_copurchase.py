@@ -0,0 +1,57 @@
+"""Build the customers-also-bought matrix from paid line items"""
+import array
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from bangazonapi.copurchase import (
+    count_pairs, discount_logged, log_path, matrix_path, write_matrix
+)
+from bangazonapi.models import OrderProduct
+
+
+class Command(BaseCommand):
+    help = ("Count how often each pair of products was bought together and write the "
+            "memory-mapped co-purchase matrix every worker reads")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help="Number of line items fetched per round trip")
+        parser.add_argument('--max-neighbors', type=int,
+                            default=settings.COPURCHASE_MAX_NEIGHBORS,
+                            help="Most co-purchased products kept for each product")
+
+    def handle(self, *args, **options):
+        # Orders paid from here on go to a fresh log on top of the new matrix
+        building_log = f'{log_path()}.building'
+        try:
+            os.replace(log_path(), building_log)
+        except FileNotFoundError:
+            pass
+
+        line_items = (
+            OrderProduct.objects.filter(order__payment_type__isnull=False)
+            .order_by('order_id').values_list('order_id', 'product_id')
+            .iterator(chunk_size=options['chunk_size'])
+        )
+        counted_order_ids = array.array('q')
+
+        def counting(line_items):
+            for order_id, product_id in line_items:
+                if not counted_order_ids or counted_order_ids[-1] != order_id:
+                    counted_order_ids.append(order_id)
+                yield order_id, product_id
+
+        pairs = count_pairs(counting(line_items))
+        # Orders paid between the log rotation and the read are in the new
+        # log as well as in the counts. Their entries are written right after
+        # their commit, long before the read is over, so they are all there now.
+        discount_logged(pairs, counted_order_ids)
+        stored = write_matrix(pairs, options['max_neighbors'])
+
+        try:
+            os.remove(building_log)
+        except FileNotFoundError:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {stored} co-purchase pairs for {len(pairs)} products in {matrix_path()}"))
@@ -0,0 +1,71 @@
+"""Fold repeated line items for the same product on an order into one row"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Min, Sum
+from bangazonapi.models import Order, OrderProduct
+
+
+def merge_batch(after, batch_size):
+    """Merge duplicate (order, product) line items for one batch of orders
+
+    The oldest line item of each pair keeps its price and takes the summed
+    quantity of the others, which are deleted with a single statement so no
+    delete signals adjust stats or order totals for units that are kept.
+
+    Returns:
+        tuple -- Ids of the orders in the batch, empty when there are none
+            left, and the number of line items removed
+    """
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.filter(pk__gt=after).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return order_ids, 0
+
+        duplicates = (
+            OrderProduct.objects.filter(order_id__in=order_ids).order_by()
+            .values('order_id', 'product_id')
+            .annotate(rows=Count('pk'), total=Sum('quantity'), keep=Min('pk'))
+            .filter(rows__gt=1)
+        )
+        removed = 0
+        for duplicate in duplicates:
+            OrderProduct.objects.filter(pk=duplicate['keep']).update(quantity=duplicate['total'])
+            removed += duplicate['rows'] - 1
+
+        if removed:
+            quote = connection.ops.quote_name
+            table = quote(OrderProduct._meta.db_table)
+            placeholders = ', '.join(['%s'] * len(order_ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE {quote("order_id")} IN ({placeholders}) '
+                    f'AND {quote("id")} NOT IN ('
+                    f'SELECT MIN({quote("id")}) FROM {table} '
+                    f'WHERE {quote("order_id")} IN ({placeholders}) '
+                    f'GROUP BY {quote("order_id")}, {quote("product_id")})',
+                    [*order_ids, *order_ids])
+
+        return order_ids, removed
+
+
+class Command(BaseCommand):
+    help = ("Merge line items that repeat a product on the same order into one row with "
+            "the summed quantity. Older databases have one row per unit: migrate the "
+            "quantity column in first (it defaults to 1), run this, then migrate the "
+            "unique (order, product) constraint")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of orders merged per transaction")
+
+    def handle(self, *args, **options):
+        removed = 0
+        order_ids, merged = merge_batch(0, options['batch_size'])
+        while order_ids:
+            removed += merged
+            order_ids, merged = merge_batch(order_ids[-1], options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f"Merged away {removed} repeated line items"))
@@ -0,0 +1,79 @@
+"""Merge the legacy Rating table into ProductRating, one rating per customer and product"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from bangazonapi.models import ProductRating
+from bangazonapi.models.productstats import RATING_SCORES
+
+
+LEGACY_TABLE = 'bangazonapi_rating'
+
+
+def legacy_ratings():
+    """Latest legacy score for each (product id, customer id), or {} once the table is gone
+
+    Returns:
+        tuple -- The scores, and how many rows were skipped for a score outside 0 to 5
+    """
+    if LEGACY_TABLE not in connection.introspection.table_names():
+        return {}, 0
+
+    quote = connection.ops.quote_name
+    scores, skipped = {}, 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {quote("product_id")}, {quote("customer_id")}, {quote("score")} '
+            f'FROM {quote(LEGACY_TABLE)} ORDER BY {quote("id")}')
+        for product_id, customer_id, score in cursor:
+            if score in RATING_SCORES:
+                scores[(product_id, customer_id)] = score
+            else:
+                skipped += 1
+    return scores, skipped
+
+
+def delete_duplicates():
+    """Keep only the newest rating of each customer for each product
+
+    Deletes with one statement, without delete signals, so it also runs
+    before the ProductStats columns the signals update are migrated.
+
+    Returns:
+        int -- Number of ratings deleted
+    """
+    quote = connection.ops.quote_name
+    table = quote(ProductRating._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {quote("id")} NOT IN ('
+            f'SELECT MAX({quote("id")}) FROM {table} '
+            f'GROUP BY {quote("product_id")}, {quote("customer_id")})')
+        return cursor.rowcount
+
+
+class Command(BaseCommand):
+    help = ("Fold legacy Rating rows into ProductRating and drop duplicate ratings. "
+            "Run before migrating, since the migration adds the unique (product, customer) "
+            "constraint and drops the Rating table, then run rebuild_product_stats and "
+            "rebuild_leaderboards once migrated")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # For repeated ratings the most recent one, with the highest id, wins
+            removed = delete_duplicates()
+
+            # ProductRating is what the API has been reading, so it wins over legacy rows
+            rated = set(ProductRating.objects.values_list('product_id', 'customer_id'))
+            scores, skipped = legacy_ratings()
+            added = ProductRating.objects.bulk_create(
+                [
+                    ProductRating(product_id=product_id, customer_id=customer_id, rating=score)
+                    for (product_id, customer_id), score in scores.items()
+                    if (product_id, customer_id) not in rated
+                ],
+                batch_size=1000,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} duplicate ratings and merged {len(added)} legacy ratings; "
+            f"skipped {skipped} legacy ratings outside 0 to 5"))
+        self.stdout.write("Migrate, then run rebuild_product_stats and rebuild_leaderboards")
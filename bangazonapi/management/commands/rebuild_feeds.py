@@ -0,0 +1,38 @@
+"""Recompute follower counts and rebuild every customer's new-products feed"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from bangazonapi.feed import backfill
+from bangazonapi.models import Customer, Favorite, FeedEntry
+
+
+class Command(BaseCommand):
+    help = ("Recount each seller's followers and refill every feed with the newest "
+            "products of the sellers it follows")
+
+    def handle(self, *args, **options):
+        followers = (
+            Favorite.objects.filter(seller=OuterRef('pk')).order_by()
+            .values('seller').annotate(total=Count('pk')).values('total')
+        )
+        Customer.objects.update(follower_count=Coalesce(Subquery(followers), 0))
+
+        FeedEntry.objects.all().delete()
+
+        sellers = Customer.objects.filter(
+            follower_count__gt=0, follower_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).order_by('pk').values_list('pk', flat=True)
+
+        rebuilt = 0
+        for seller_id in sellers.iterator():
+            follower_ids = (
+                Favorite.objects.filter(seller_id=seller_id).order_by('customer_id')
+                .values_list('customer_id', flat=True).distinct()
+            )
+            backfill(follower_ids.iterator(), seller_id)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt feeds for the followers of {rebuilt} sellers; "
+            f"{FeedEntry.objects.count()} entries"))
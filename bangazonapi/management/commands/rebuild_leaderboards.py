@@ -0,0 +1,28 @@
+"""Recompute every top-rated leaderboard from ProductStats scores"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from bangazonapi.models import LeaderboardEntry, ProductCategory
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the catalog-wide and per-category top-rated leaderboards; "
+            "run after rebuild_product_stats")
+
+    def handle(self, *args, **options):
+        size = settings.LEADERBOARD_SIZE
+        boards = {None: list(LeaderboardEntry.objects.ranked()[:size])}
+        for category_id in ProductCategory.objects.order_by('pk').values_list('pk', flat=True):
+            boards[category_id] = list(LeaderboardEntry.objects.ranked(category_id)[:size])
+
+        with transaction.atomic():
+            LeaderboardEntry.objects.all().delete()
+            LeaderboardEntry.objects.bulk_create([
+                LeaderboardEntry(category_id=category_id, product_id=product_id, score=score)
+                for category_id, entries in boards.items()
+                for product_id, score in entries
+            ])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(boards)} leaderboards with "
+            f"{sum(len(entries) for entries in boards.values())} entries"))
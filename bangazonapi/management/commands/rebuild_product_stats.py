@@ -0,0 +1,82 @@
+"""Recompute the ProductStats table from line items and ratings"""
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from bangazonapi.models import OrderProduct, Product, ProductRating, ProductStats
+from bangazonapi.models.productstats import bayesian_score
+
+
+STATS_FIELDS = ['units_sold', 'revenue', 'rating_count', 'rating_sum',
+                'rating_0', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5', 'score']
+
+
+def rebuild_range(start, stop):
+    """Recompute stats for every product with start <= id < stop
+
+    Returns:
+        int -- Number of stats rows written
+    """
+    try:
+        with transaction.atomic():
+            product_ids = Product.objects.filter(
+                pk__gte=start, pk__lt=stop).values_list('pk', flat=True)
+            rows = {pk: ProductStats(product_id=pk) for pk in product_ids}
+
+            sales = OrderProduct.objects.filter(
+                product_id__gte=start, product_id__lt=stop,
+                order__payment_type__isnull=False
+            ).order_by().values('product').annotate(
+                units=Sum('quantity'), revenue=Sum(F('quantity') * F('unit_price')))
+
+            for sale in sales:
+                row = rows[sale['product']]
+                row.units_sold = sale['units']
+                row.revenue = sale['revenue']
+
+            ratings = ProductRating.objects.filter(
+                product_id__gte=start, product_id__lt=stop
+            ).order_by().values('product', 'rating').annotate(given=Count('pk'))
+
+            for rating in ratings:
+                row = rows[rating['product']]
+                row.rating_count += rating['given']
+                row.rating_sum += rating['rating'] * rating['given']
+                setattr(row, f"rating_{rating['rating']}", rating['given'])
+
+            for row in rows.values():
+                row.score = bayesian_score(row.rating_sum, row.rating_count)
+
+            ProductStats.objects.bulk_create(
+                rows.values(), update_conflicts=True,
+                unique_fields=['product'], update_fields=STATS_FIELDS)
+
+            return len(rows)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Recompute ProductStats for every product in parallel chunks of product ids"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="Number of product ids handled per chunk")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Number of chunks rebuilt concurrently")
+
+    def handle(self, *args, **options):
+        bounds = Product.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            self.stdout.write("No products to rebuild")
+            return
+
+        chunk_size = options['chunk_size']
+        ranges = [(start, start + chunk_size)
+                  for start in range(bounds['first'], bounds['last'] + 1, chunk_size)]
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            written = sum(pool.map(lambda bounds: rebuild_range(*bounds), ranges))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats for {written} products in {len(ranges)} chunks"))
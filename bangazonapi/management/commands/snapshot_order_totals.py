@@ -0,0 +1,46 @@
+"""Record unit prices on older line items and store every order's totals"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from bangazonapi.models import Order, OrderProduct, Product
+
+
+def snapshot_batch(after, batch_size):
+    """Fill in missing unit prices and recompute totals for one batch of orders
+
+    Line items without a unit price are given their product's current price,
+    the best that is known for sales recorded before prices were kept.
+
+    Returns:
+        list -- Ids of the orders in the batch, empty when there are none left
+    """
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.filter(pk__gt=after).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return order_ids
+
+        OrderProduct.objects.filter(order_id__in=order_ids, unit_price__isnull=True).update(
+            unit_price=Subquery(Product.objects.filter(pk=OuterRef('product')).values('price')))
+        Order.objects.filter(pk__in=order_ids).refresh_totals()
+        return order_ids
+
+
+class Command(BaseCommand):
+    help = ("Give line items without a unit price their product's current price and "
+            "recompute item_count and subtotal for every order, paid ones included")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of orders updated per transaction")
+
+    def handle(self, *args, **options):
+        orders = 0
+        order_ids = snapshot_batch(0, options['batch_size'])
+        while order_ids:
+            orders += len(order_ids)
+            order_ids = snapshot_batch(order_ids[-1], options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f"Stored totals for {orders} orders"))
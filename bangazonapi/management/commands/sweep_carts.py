@@ -0,0 +1,97 @@
+"""Release expired stock reservations and remove abandoned open orders"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from bangazonapi.cache import invalidate_products
+from bangazonapi.models import Order, OrderProduct, StockReservation
+
+
+def sweep_reservations(now, batch_size):
+    """Delete one batch of expired reservations
+
+    Returns:
+        int -- Number of reservations deleted
+    """
+    with transaction.atomic():
+        batch = list(
+            StockReservation.objects.expired(now).order_by('pk')
+            .values_list('pk', 'product_id')[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        StockReservation.objects.filter(pk__in=[pk for pk, _ in batch]).delete()
+        # Availability already excludes expired holds; cached copies may not
+        invalidate_products({product_id for _, product_id in batch})
+        return len(batch)
+
+
+def delete_line_items(order_ids):
+    """Delete the orders' line items in one statement, without delete signals
+
+    The signals would refresh each order's totals, one row at a time, for
+    orders that are deleted right after. Open orders have no sales stats.
+    """
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(OrderProduct._meta.db_table)} '
+            f'WHERE {quote("order_id")} IN ({placeholders})',
+            order_ids)
+
+
+def sweep_open_orders(now, cutoff, batch_size):
+    """Delete one batch of open orders with no cart activity since the cutoff
+
+    Orders another transaction is working on are skipped rather than
+    waited for, and orders still holding an active reservation are kept.
+
+    Returns:
+        int -- Number of orders deleted
+    """
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(payment_type__isnull=True, updated__lt=cutoff)
+            .exclude(pk__in=StockReservation.objects.active(now).values('order'))
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0
+
+        delete_line_items(order_ids)
+        Order.objects.filter(pk__in=order_ids).delete()
+        return len(order_ids)
+
+
+class Command(BaseCommand):
+    help = ("Delete expired stock reservations and open orders with no cart activity for "
+            "OPEN_ORDER_MAX_AGE, one short transaction per batch")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Number of rows deleted per transaction")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        cutoff = now - settings.OPEN_ORDER_MAX_AGE
+
+        reservations = 0
+        while True:
+            deleted = sweep_reservations(now, batch_size)
+            if not deleted:
+                break
+            reservations += deleted
+
+        orders = 0
+        while True:
+            deleted = sweep_open_orders(now, cutoff, batch_size)
+            if not deleted:
+                break
+            orders += deleted
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Released {reservations} expired reservations and removed {orders} abandoned carts"))
@@ -5,6 +5,9 @@ from .payment import Payment
 from .product import Product
 from .productcategory import ProductCategory
 from .recommendation import Recommendation
-from .rating import Rating
 from .favorite import Favorite
 from .productrating import ProductRating
+from .productstats import ProductStats
+from .stockreservation import StockReservation
+from .feedentry import FeedEntry
+from .leaderboard import LeaderboardEntry
@@ -7,6 +7,8 @@ class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.DO_NOTHING,)
     phone_number = models.CharField(max_length=15)
     address = models.CharField(max_length=55)
+    # Number of Favorite rows naming this customer as the seller
+    follower_count = models.IntegerField(default=0)
 
     @property
     def recommends(self):
@@ -0,0 +1,27 @@
+"""Module for the new-products timelines of customers following sellers"""
+from django.db import models
+
+
+class FeedEntry(models.Model):
+
+    customer = models.ForeignKey("Customer",
+                                 on_delete=models.CASCADE,
+                                 related_name="feed")
+    product = models.ForeignKey("Product",
+                                on_delete=models.CASCADE,
+                                related_name="feed_entries")
+    # Denormalized from the product so unfollowing can drop a seller's entries
+    seller = models.ForeignKey("Customer",
+                               on_delete=models.CASCADE,
+                               related_name="+")
+
+    class Meta:
+        verbose_name = ("feedentry")
+        verbose_name_plural = ("feedentries")
+        indexes = [
+            models.Index(fields=['seller', 'customer'], name='feedentry_seller_idx'),
+        ]
+        constraints = [
+            # Also the index a feed page is read from, newest product first
+            models.UniqueConstraint(fields=['customer', 'product'], name='feedentry_customer_product_uniq'),
+        ]
@@ -0,0 +1,151 @@
+"""Module for precomputed top-rated product leaderboards"""
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .product import Product
+from .productcategory import PATH_SEPARATOR, ProductCategory
+
+
+def category_ids(product_id):
+    """Ids of a product's category and all of its ancestors"""
+    path = Product.objects.filter(pk=product_id).values_list('category__path', flat=True).first()
+    return [int(part) for part in (path or '').split(PATH_SEPARATOR) if part]
+
+
+class LeaderboardEntryManager(models.Manager):
+    """Incremental maintenance of the top-rated leaderboards
+
+    There is one board per category, covering the products in its subtree,
+    plus a catalog-wide board with no category. Each keeps the
+    LEADERBOARD_SIZE best-scored rated products. Every change locks the
+    board's entries first, so concurrent changes to one board evict and
+    promote products one at a time. Moving a whole category under another
+    parent is not followed; run rebuild_leaderboards afterwards.
+    """
+
+    def board(self, category_id=None):
+        """Entries of one board, best score first"""
+        if category_id is None:
+            return self.filter(category__isnull=True).order_by('-score', 'product_id')
+        return self.filter(category_id=category_id).order_by('-score', 'product_id')
+
+    def ranked(self, category_id=None):
+        """Every rated product a board covers, as (product id, score), best score first"""
+        products = Product.objects.filter(stats__rating_count__gt=0)
+        if category_id is not None:
+            products = products.filter(category__in=ProductCategory.objects.subtree(category_id))
+        return products.order_by('-stats__score', 'pk').values_list('pk', 'stats__score')
+
+    def lock(self, category_id):
+        """Lock a board's entries until the surrounding transaction ends"""
+        list(self.board(category_id).select_for_update().values_list('pk', flat=True))
+
+    def trim(self, category_id):
+        """Drop the entries past LEADERBOARD_SIZE from a board"""
+        extra = list(self.board(category_id).values_list('pk', flat=True)[settings.LEADERBOARD_SIZE:])
+        if extra:
+            self.filter(pk__in=extra).delete()
+
+    def promote(self, category_id):
+        """Bring the best product missing from a board onto it if it now belongs there
+
+        A board only ever loses one place at a time, when an entry's score
+        drops or it leaves the board, so one candidate is enough to refill it.
+        """
+        entries = self.board(category_id)
+        best = self.ranked(category_id).exclude(pk__in=entries.values('product_id')).first()
+        if best is None:
+            return
+
+        size = settings.LEADERBOARD_SIZE
+        lowest = list(entries.values_list('score', flat=True)[size - 1:size])
+        if not lowest or best[1] > lowest[0]:
+            self.create(category_id=category_id, product_id=best[0], score=best[1])
+            self.trim(category_id)
+
+    def place(self, category_id, product_id, score):
+        """Put a product's new score on one board"""
+        with transaction.atomic(using=self.db):
+            self.lock(category_id)
+            entries = self.board(category_id)
+
+            current = entries.filter(product_id=product_id).values_list('pk', 'score').first()
+            if current is not None:
+                self.filter(pk=current[0]).update(score=score)
+                if score < current[1]:
+                    self.promote(category_id)
+                return
+
+            size = settings.LEADERBOARD_SIZE
+            lowest = list(entries.values_list('score', flat=True)[size - 1:size])
+            if lowest and score <= lowest[0]:
+                return
+
+            self.create(category_id=category_id, product_id=product_id, score=score)
+            self.trim(category_id)
+
+    def leave(self, category_id, product_id):
+        """Take a product off one board and give its place to the next best"""
+        with transaction.atomic(using=self.db):
+            self.lock(category_id)
+            if self.board(category_id).filter(product_id=product_id).delete()[0]:
+                self.promote(category_id)
+
+    def record_score(self, product_id, score):
+        """Move a product on every board it belongs to after its score changed"""
+        for category_id in [None] + category_ids(product_id):
+            self.place(category_id, product_id, score)
+
+    def remove_product(self, product_id):
+        """Take a product that no longer has ratings off every board"""
+        boards = self.filter(product_id=product_id).values_list('category_id', flat=True)
+        for category_id in list(boards):
+            self.leave(category_id, product_id)
+
+    def recategorize(self, product_id):
+        """Move a product to the boards of the category it was moved to"""
+        boards = self.filter(product_id=product_id, category__isnull=False).exclude(
+            category_id__in=category_ids(product_id)).values_list('category_id', flat=True)
+        for category_id in list(boards):
+            self.leave(category_id, product_id)
+
+        score = Product.objects.filter(pk=product_id, stats__rating_count__gt=0).values_list(
+            'stats__score', flat=True).first()
+        if score is not None:
+            self.record_score(product_id, score)
+
+
+class LeaderboardEntry(models.Model):
+
+    category = models.ForeignKey("ProductCategory",
+                                 on_delete=models.CASCADE,
+                                 null=True,
+                                 related_name="leaderboard")
+    product = models.ForeignKey("Product",
+                                on_delete=models.CASCADE,
+                                related_name="leaderboard_entries")
+    score = models.FloatField()
+
+    objects = LeaderboardEntryManager()
+
+    class Meta:
+        verbose_name = ("leaderboardentry")
+        verbose_name_plural = ("leaderboardentries")
+        indexes = [
+            models.Index(fields=['category', '-score', 'product'], name='leaderboard_board_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'product'],
+                                    name='leaderboard_category_product_uniq'),
+            models.UniqueConstraint(fields=['product'], condition=Q(category__isnull=True),
+                                    name='leaderboard_catalog_product_uniq'),
+        ]
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_category_id', None)
+    if not created and not raw and previous is not None and previous != instance.category_id:
+        LeaderboardEntry.objects.recategorize(instance.pk)
@@ -1,14 +1,102 @@
 """Module for for Park Areas"""
+import datetime
 from django.db import models
+from django.db.models import F, OuterRef, Prefetch, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Now
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from .customer import Customer
+from .orderproduct import OrderProduct
 from .payment import Payment
 
 
+class OrderQuerySet(models.QuerySet):
+    """Custom queryset for orders"""
+
+    def with_line_items(self, products=None):
+        """Prefetch line items and their products, including product stats
+
+        Arguments:
+            products {QuerySet} -- Product queryset for the line items' products
+
+        Returns:
+            QuerySet -- Orders with lineitems ready for nested serialization
+        """
+        line_items = OrderProduct.objects.with_product_stats(products)
+        return self.prefetch_related(Prefetch('lineitems', queryset=line_items))
+
+    def open(self):
+        """Orders that have not been paid for yet"""
+        return self.filter(payment_type__isnull=True)
+
+    def get_or_create_open(self, customer):
+        """The customer's open order, created if they do not have one yet
+
+        A customer can only have one open order. When two requests race to
+        create it, the order_one_open_per_customer constraint rejects the
+        second insert and get_or_create() returns the first one's order.
+        """
+        order, _ = self.get_or_create(
+            customer=customer, payment_type=None,
+            defaults={'created_date': datetime.date.today()})
+        return order
+
+    def refresh_totals(self, touch=False):
+        """Recompute item_count and subtotal from the orders' line items
+
+        Runs as a single UPDATE. Callers maintaining totals after a line item
+        change should narrow the queryset with open() first, since the totals
+        of a paid order are frozen at checkout.
+
+        Arguments:
+            touch {bool} -- Also record the change as cart activity in `updated`
+
+        Returns:
+            int -- Number of orders updated
+        """
+        line_items = OrderProduct.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        activity = {'updated': Now()} if touch else {}
+        return self.update(
+            **activity,
+            item_count=Coalesce(
+                Subquery(line_items.annotate(total=Sum('quantity')).values('total')), 0),
+            subtotal=Coalesce(
+                Subquery(line_items.annotate(
+                    total=Sum(F('quantity') * F('unit_price'))).values('total')), 0.0),
+        )
+
+
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.DO_NOTHING,)
     payment_type = models.ForeignKey(Payment, on_delete=models.DO_NOTHING, null=True)
     created_date = models.DateField(default="0000-00-00",)
+    # Maintained from the line items while the order is open, then frozen at checkout
+    item_count = models.IntegerField(default=0)
+    subtotal = models.FloatField(default=0)
+    # Last time a line item was added, changed or removed; sweep_carts
+    # removes open orders that have been idle for OPEN_ORDER_MAX_AGE
+    updated = models.DateTimeField(default=timezone.now)
+
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = ("order")
         verbose_name_plural = ("orders")
+        indexes = [
+            models.Index(fields=['customer', 'created_date', 'id'], name='order_customer_created_idx'),
+            models.Index(fields=['updated'], condition=Q(payment_type__isnull=True),
+                         name='order_open_updated_idx'),
+        ]
+        constraints = [
+            # Also the index behind every open order (cart) lookup
+            models.UniqueConstraint(fields=['customer'], condition=Q(payment_type__isnull=True),
+                                    name='order_one_open_per_customer'),
+        ]
+
+
+@receiver(post_save, sender=OrderProduct)
+@receiver(post_delete, sender=OrderProduct)
+def line_item_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Order.objects.filter(pk=instance.order_id).open().refresh_totals(touch=True)
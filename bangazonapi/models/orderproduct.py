@@ -1,4 +1,65 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Prefetch
+
+
+class OrderProductQuerySet(models.QuerySet):
+    """Custom queryset for order line items"""
+
+    def with_product_stats(self, products=None):
+        """Prefetch each line item's product with its computed stats
+
+        Arguments:
+            products {QuerySet} -- Product queryset to prefetch with instead
+                of the default one carrying every computed field
+
+        Returns:
+            QuerySet -- Line items whose products carry number_sold and average_rating
+        """
+        if products is None:
+            product_model = self.model._meta.get_field('product').related_model
+            products = product_model.objects.with_stats().with_availability().select_related(
+                'category')
+        return self.prefetch_related(Prefetch('product', queryset=products))
+
+    def add_to_order(self, order_id, quantities):
+        """Add products to an order in a single INSERT ... ON CONFLICT statement
+
+        Products already on the order have their quantity increased instead
+        of getting a second line item. New line items record the product's
+        current price; existing ones keep the price they were added at. Save
+        signals are not sent, so the order's totals are refreshed here.
+
+        Arguments:
+            order_id {int} -- Order to add the products to
+            quantities {dict} -- Product id mapped to the quantity to add
+        """
+        if not quantities:
+            return
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        quantity = quote('quantity')
+        product_model = self.model._meta.get_field('product').related_model
+        order_model = self.model._meta.get_field('order').related_model
+        price = (f'(SELECT {quote("price")} FROM {quote(product_model._meta.db_table)} '
+                 f'WHERE {quote("id")} = %s)')
+
+        rows = ', '.join([f'(%s, %s, %s, {price})'] * len(quantities))
+        params = []
+        for product_id, amount in quantities.items():
+            params.extend((order_id, product_id, amount, product_id))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({quote("order_id")}, {quote("product_id")}, '
+                f'{quantity}, {quote("unit_price")}) '
+                f'VALUES {rows} '
+                f'ON CONFLICT ({quote("order_id")}, {quote("product_id")}) '
+                f'DO UPDATE SET {quantity} = {table}.{quantity} + EXCLUDED.{quantity}',
+                params)
+
+        order_model.objects.filter(pk=order_id).open().refresh_totals(touch=True)
 
 
 class OrderProduct(models.Model):
@@ -10,3 +71,25 @@ class OrderProduct(models.Model):
     product = models.ForeignKey("Product",
                                 on_delete=models.DO_NOTHING,
                                 related_name="lineitems")
+
+    quantity = models.PositiveIntegerField(default=1)
+
+    # Price of one unit when the product was added, or at checkout for
+    # line items added before prices were recorded
+    unit_price = models.FloatField(null=True)
+
+    objects = OrderProductQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        # Product stats and order totals follow from post_save; they commit
+        # or roll back together with the line item
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'order'], name='orderproduct_product_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product'], name='orderproduct_order_product_uniq'),
+        ]
@@ -12,3 +12,6 @@ class Payment(models.Model):
     class Meta:
         verbose_name = ("payment")
         verbose_name_plural = ("payments")
+        indexes = [
+            models.Index(fields=['create_date', 'id'], name='payment_created_idx'),
+        ]
@@ -1,9 +1,60 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import F, FloatField, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.db.models.signals import pre_save
+from django.dispatch import Signal, receiver
 from .customer import Customer
 from .productcategory import ProductCategory
-from .orderproduct import OrderProduct
-from .productrating import ProductRating
+from .stockreservation import StockReservation
+
+
+# bulk_create skips save signals, so bulk inserts send `products` with this
+products_bulk_created = Signal()
+
+
+class ProductQuerySet(models.QuerySet):
+    """Custom queryset for products"""
+
+    def with_stats(self):
+        """Annotate number_sold and average_rating onto each product
+
+        The values are read from the product's ProductStats row in the same
+        SQL statement, so serializing a list of products costs no extra
+        queries per row no matter how many orders or ratings exist.
+
+        Returns:
+            QuerySet -- Products annotated with number_sold and average_rating
+        """
+        rating_sum = Cast('stats__rating_sum', FloatField())
+        rating_count = NullIf('stats__rating_count', 0)
+
+        return self.annotate(
+            number_sold=Coalesce('stats__units_sold', 0),
+            average_rating=Coalesce(rating_sum / rating_count, 0.0),
+        )
+
+    def with_availability(self):
+        """Annotate available, the stock not held by active reservations
+
+        Returns:
+            QuerySet -- Products annotated with available
+        """
+        reserved = Subquery(StockReservation.objects.reserved_for())
+        return self.annotate(available=F('quantity') - Coalesce(reserved, 0))
+
+    def sold_at_least(self, count):
+        """Filter to products with at least `count` items on completed orders
+
+        Returns:
+            QuerySet -- Products that have sold `count` or more items
+        """
+        if count <= 0:
+            return self
+
+        return self.filter(stats__units_sold__gte=count)
 
 
 class Product(models.Model):
@@ -22,6 +73,10 @@ class Product(models.Model):
     image_path = models.ImageField(
         upload_to='products', height_field=None,
         width_field=None, max_length=None, null=True)
+    image_variants = models.JSONField(default=dict, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
 
     @property
     def number_sold(self):
@@ -30,9 +85,39 @@ class Product(models.Model):
         Returns:
             int -- Number items on completed orders
         """
-        sold = OrderProduct.objects.filter(
-            product=self, order__payment_type__isnull=False)
-        return sold.count()
+        try:
+            return self.__number_sold
+        except AttributeError:
+            pass
+
+        try:
+            return self.stats.units_sold
+        except ObjectDoesNotExist:
+            return 0
+
+    @number_sold.setter
+    def number_sold(self, value):
+        self.__number_sold = value
+
+    @property
+    def available(self):
+        """Units in stock that no active reservation is holding
+
+        Returns:
+            int -- Stock minus actively reserved units
+        """
+        try:
+            return self.__available
+        except AttributeError:
+            pass
+
+        reserved = StockReservation.objects.active().filter(
+            product=self).aggregate(total=Sum('quantity'))['total']
+        return self.quantity - (reserved or 0)
+
+    @available.setter
+    def available(self, value):
+        self.__available = value
 
     @property
     def can_be_rated(self):
@@ -54,17 +139,34 @@ class Product(models.Model):
         Returns:
             number -- The average rating for the product
         """
-        ratings = ProductRating.objects.filter(product=self)
-        total_rating = 0
-        for rating in ratings:
-            total_rating += rating.rating
+        try:
+            return self.__average_rating
+        except AttributeError:
+            pass
 
         try:
-            avg = total_rating / len(ratings)
-        except ZeroDivisionError:
-            avg = 0
-        return avg
+            return self.stats.average_rating
+        except ObjectDoesNotExist:
+            return 0
+
+    @average_rating.setter
+    def average_rating(self, value):
+        self.__average_rating = value
 
     class Meta:
         verbose_name = ("product")
         verbose_name_plural = ("products")
+        indexes = [
+            models.Index(fields=['created_date', 'id'], name='product_created_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['customer', 'id'], name='product_seller_idx'),
+        ]
+
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, raw=False, **kwargs):
+    """Remember the category a product is saved from, for receivers following moves"""
+    instance._previous_category_id = None
+    if instance.pk is not None and not raw:
+        instance._previous_category_id = Product.objects.filter(
+            pk=instance.pk).values_list('category_id', flat=True).first()
@@ -1,10 +1,102 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+
+PATH_SEPARATOR = '/'
+
+
+class ProductCategoryQuerySet(models.QuerySet):
+    """Custom queryset for product categories"""
+
+    def subtree(self, category_id):
+        """A category together with all of its descendants
+
+        Every category stores the ids of its ancestors as a materialized
+        path, so the whole subtree is one indexed prefix match.
+
+        Returns:
+            QuerySet -- Categories at or below `category_id`
+        """
+        path = self.model.objects.filter(pk=category_id).values_list('path', flat=True).first()
+        if not path:
+            return self.filter(pk=category_id)
+        return self.filter(path__startswith=path)
 
 
 class ProductCategory(models.Model):
 
     name = models.CharField(max_length=55)
+    parent = models.ForeignKey("self",
+                               on_delete=models.DO_NOTHING,
+                               null=True,
+                               related_name="children")
+    path = models.CharField(max_length=255, db_index=True, default='', editable=False)
+
+    objects = ProductCategoryQuerySet.as_manager()
+
+    @property
+    def ancestor_ids(self):
+        """Ids from the root category down to this one
+
+        Returns:
+            list -- Category ids along the materialized path
+        """
+        return [int(part) for part in self.path.split(PATH_SEPARATOR) if part]
+
+    def build_path(self):
+        parent_path = ''
+        if self.parent_id is not None:
+            parent_path = ProductCategory.objects.filter(
+                pk=self.parent_id).values_list('path', flat=True).first() or ''
+        return f'{parent_path}{self.pk}{PATH_SEPARATOR}'
+
+    def check_parent(self):
+        """Refuse a parent that is the category itself or one of its descendants
+
+        Raises:
+            ValidationError -- If the new parent would create a cycle
+        """
+        if self.parent_id is None or self.pk is None:
+            return
+
+        own_path = ProductCategory.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+        parent_path = ProductCategory.objects.filter(
+            pk=self.parent_id).values_list('path', flat=True).first()
+        if self.parent_id == self.pk or (own_path and parent_path and parent_path.startswith(own_path)):
+            raise ValidationError(
+                {'parent': 'A category cannot be placed under itself or one of its subcategories'})
+
+    def clean(self):
+        self.check_parent()
 
     class Meta:
         verbose_name = ("productcategory")
-        verbose_name_plural = ("productcategories")
\ No newline at end of file
+        verbose_name_plural = ("productcategories")
+
+
+@receiver(pre_save, sender=ProductCategory)
+def category_saving(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.check_parent()
+    instance._previous_path = instance.path
+
+
+@receiver(post_save, sender=ProductCategory)
+def category_saved(sender, instance, **kwargs):
+    """Keep the materialized path of a category and its descendants current"""
+    old_path = instance.path
+    new_path = instance.build_path()
+    if old_path == new_path:
+        return
+
+    ProductCategory.objects.filter(pk=instance.pk).update(path=new_path)
+    if old_path:
+        # Descendants swap the old prefix for the new one in a single UPDATE
+        ProductCategory.objects.filter(
+            path__startswith=old_path).exclude(pk=instance.pk).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)))
+    instance.path = new_path
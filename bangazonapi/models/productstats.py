@@ -0,0 +1,218 @@
+"""Module for denormalized per-product sales and rating aggregates"""
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import F, Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+from .leaderboard import LeaderboardEntry
+from .orderproduct import OrderProduct
+from .productrating import ProductRating, rating_upserted
+
+
+RATING_SCORES = range(0, 6)
+COUNTER_FIELDS = ('units_sold', 'revenue', 'rating_count', 'rating_sum',
+                  *[f'rating_{score}' for score in RATING_SCORES])
+
+# Sent with `product_id` whenever a product's counters are adjusted
+stats_changed = Signal()
+
+
+def bayesian_score(rating_sum, rating_count):
+    """Average rating pulled towards RATING_PRIOR_MEAN while there are few ratings
+
+    Behaves as if every product started with RATING_PRIOR_WEIGHT ratings of
+    RATING_PRIOR_MEAN, so one 5 star rating does not outrank a hundred 4s.
+    Accepts numbers or expressions.
+    """
+    weight = settings.RATING_PRIOR_WEIGHT
+    return (weight * settings.RATING_PRIOR_MEAN + rating_sum) / (weight + rating_count)
+
+
+class ProductStatsManager(models.Manager):
+    """Incremental maintenance of ProductStats rows
+
+    Counters are adjusted relative to the stored values, never overwritten,
+    so concurrent writes to one product add up. The signal handlers below
+    run inside the transaction of the write that caused them: deletes send
+    post_delete inside theirs, and line items and ratings save atomically.
+    """
+
+    def increment(self, product_id, **deltas):
+        """Add the given deltas to a product's counters
+
+        Runs as a single INSERT ... ON CONFLICT DO UPDATE statement, which
+        creates the row with the deltas as its counters if the product has
+        none yet.
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+
+        columns = ', '.join(quote(field) for field in ('product_id', *COUNTER_FIELDS, 'score'))
+        placeholders = ', '.join(['%s'] * (len(COUNTER_FIELDS) + 2))
+        params = [product_id, *[deltas.get(field, 0) for field in COUNTER_FIELDS],
+                  bayesian_score(deltas.get('rating_sum', 0), deltas.get('rating_count', 0))]
+
+        updates = [f'{quote(field)} = {table}.{quote(field)} + EXCLUDED.{quote(field)}'
+                   for field in deltas]
+        if 'rating_count' in deltas or 'rating_sum' in deltas:
+            # bayesian_score() of the new sum and count
+            weight = settings.RATING_PRIOR_WEIGHT
+            rating_sum, rating_count = quote('rating_sum'), quote('rating_count')
+            updates.append(
+                f'{quote("score")} = '
+                f'(%s + {table}.{rating_sum} + EXCLUDED.{rating_sum}) / '
+                f'(%s + {table}.{rating_count} + EXCLUDED.{rating_count})')
+            params += [float(weight * settings.RATING_PRIOR_MEAN), float(weight)]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES ({placeholders}) '
+                f'ON CONFLICT ({quote("product_id")}) DO UPDATE SET {", ".join(updates)}',
+                params)
+
+        stats_changed.send(sender=ProductStats, product_id=product_id)
+
+    @transaction.atomic
+    def record_sale(self, order):
+        """Count every unit on a newly paid order as sold, at the price it was sold for"""
+        sales = OrderProduct.objects.filter(order=order).order_by().values(
+            'product').annotate(units=Sum('quantity'), revenue=Sum(F('quantity') * F('unit_price')))
+
+        for sale in sales:
+            self.increment(
+                sale['product'],
+                units_sold=sale['units'],
+                revenue=sale['revenue'],
+            )
+
+    def record_line_item(self, line_item, units):
+        """Adjust sales by units added to (positive) or taken off (negative) a paid line item"""
+        if not units or line_item.order.payment_type_id is None:
+            return
+
+        self.increment(
+            line_item.product_id,
+            units_sold=units,
+            revenue=units * (
+                line_item.product.price if line_item.unit_price is None else line_item.unit_price),
+        )
+
+    @transaction.atomic
+    def record_rating(self, product_id, old=None, new=None):
+        """Move a product's rating aggregates from an old score to a new one"""
+        deltas = {'rating_count': 0, 'rating_sum': 0}
+
+        if old is not None:
+            deltas['rating_count'] -= 1
+            deltas['rating_sum'] -= old
+            deltas[f'rating_{old}'] = deltas.get(f'rating_{old}', 0) - 1
+
+        if new is not None:
+            deltas['rating_count'] += 1
+            deltas['rating_sum'] += new
+            deltas[f'rating_{new}'] = deltas.get(f'rating_{new}', 0) + 1
+
+        self.increment(product_id, **deltas)
+
+        ranking = self.filter(product_id=product_id, rating_count__gt=0).values_list(
+            'score', flat=True).first()
+        if ranking is None:
+            LeaderboardEntry.objects.remove_product(product_id)
+        else:
+            LeaderboardEntry.objects.record_score(product_id, ranking)
+
+
+class ProductStats(models.Model):
+
+    product = models.OneToOneField("Product",
+                                   on_delete=models.CASCADE,
+                                   primary_key=True,
+                                   related_name="stats")
+    units_sold = models.IntegerField(default=0, db_index=True)
+    revenue = models.FloatField(default=0)
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_0 = models.IntegerField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+    # bayesian_score() of the ratings, for ranking
+    score = models.FloatField(default=0)
+
+    objects = ProductStatsManager()
+
+    @property
+    def average_rating(self):
+        """Average rating from the stored count and sum
+
+        Returns:
+            number -- The average rating, or 0 when there are no ratings
+        """
+        if self.rating_count == 0:
+            return 0
+        return self.rating_sum / self.rating_count
+
+    @property
+    def histogram(self):
+        """Number of ratings given for each score
+
+        Returns:
+            dict -- Score mapped to how many times it was given
+        """
+        return {score: getattr(self, f'rating_{score}') for score in RATING_SCORES}
+
+    class Meta:
+        verbose_name = ("productstats")
+        verbose_name_plural = ("productstats")
+
+
+@receiver(pre_save, sender=OrderProduct)
+def line_item_saving(sender, instance, raw=False, **kwargs):
+    instance._previous_quantity = None
+    if instance.pk is not None and not raw:
+        instance._previous_quantity = OrderProduct.objects.filter(
+            pk=instance.pk).values_list('quantity', flat=True).first()
+
+
+@receiver(post_save, sender=OrderProduct)
+def line_item_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        previous = 0 if created else instance._previous_quantity or 0
+        ProductStats.objects.record_line_item(instance, instance.quantity - previous)
+
+
+@receiver(post_delete, sender=OrderProduct)
+def line_item_deleted(sender, instance, **kwargs):
+    ProductStats.objects.record_line_item(instance, -instance.quantity)
+
+
+@receiver(pre_save, sender=ProductRating)
+def rating_saving(sender, instance, raw=False, **kwargs):
+    instance._previous_rating = None
+    if instance.pk is not None and not raw:
+        instance._previous_rating = ProductRating.objects.filter(
+            pk=instance.pk).values_list('rating', flat=True).first()
+
+
+@receiver(post_save, sender=ProductRating)
+def rating_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ProductStats.objects.record_rating(
+            instance.product_id, old=instance._previous_rating, new=instance.rating)
+
+
+@receiver(post_delete, sender=ProductRating)
+def rating_deleted(sender, instance, **kwargs):
+    ProductStats.objects.record_rating(instance.product_id, old=instance.rating)
+
+
+@receiver(rating_upserted)
+def rating_written(sender, product_id, old, new, **kwargs):
+    ProductStats.objects.record_rating(product_id, old=old, new=new)
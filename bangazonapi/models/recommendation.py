@@ -9,3 +9,8 @@ class Recommendation(models.Model):
     product = models.ForeignKey(Product, on_delete=models.DO_NOTHING,  related_name='recommendations')
     recommender = models.ForeignKey(Customer, related_name='recommender', on_delete=models.DO_NOTHING,)
     is_shown = models.BooleanField(default=False,)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'is_shown', 'id'], name='recommendation_inbox_idx'),
+        ]
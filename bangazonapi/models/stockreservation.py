@@ -0,0 +1,50 @@
+"""Module for time-limited holds on product stock"""
+from django.db import models
+from django.db.models import OuterRef, Sum
+from django.utils import timezone
+
+
+class StockReservationQuerySet(models.QuerySet):
+    """Custom queryset for stock reservations"""
+
+    def active(self, now=None):
+        return self.filter(expires_at__gt=now or timezone.now())
+
+    def expired(self, now=None):
+        return self.filter(expires_at__lte=now or timezone.now())
+
+    def reserved_for(self, product_ref=OuterRef('pk'), now=None):
+        """Units held by active reservations of a product, for use in a Subquery
+
+        Returns:
+            QuerySet -- A single `total` value summed over the product's reservations
+        """
+        return (
+            self.active(now).filter(product=product_ref).order_by()
+            .values('product').annotate(total=Sum('quantity')).values('total')
+        )
+
+
+class StockReservation(models.Model):
+
+    order = models.ForeignKey("Order",
+                              on_delete=models.CASCADE,
+                              related_name="reservations")
+    product = models.ForeignKey("Product",
+                                on_delete=models.CASCADE,
+                                related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    objects = StockReservationQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = ("stockreservation")
+        verbose_name_plural = ("stockreservations")
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product'], name='reservation_order_product_uniq'),
+        ]
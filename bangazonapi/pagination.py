@@ -0,0 +1,163 @@
+"""Keyset pagination for list views in the Bangazon Platform"""
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Opt-in cursor pagination keyed on (ordering field, id)
+
+    Pages are selected with a WHERE clause on the last row seen instead of
+    an OFFSET, so deep pages cost the same as the first one as long as an
+    index covers (ordering field, id). Only the orderings listed in
+    `ordering_fields` are honored for that reason.
+
+    Pagination only kicks in when the client sends `cursor` or `page_size`,
+    so existing clients keep getting a plain array, unless `always` is set
+    for views that were paginated from the start.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'order_by'
+    direction_query_param = 'direction'
+    page_size = api_settings.PAGE_SIZE or 10
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering_fields=('created_date',), default_ordering='-created_date',
+                 always=False):
+        self.ordering_fields = ordering_fields
+        self.default_ordering = default_ordering
+        self.always = always
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (not self.always and
+                self.cursor_query_param not in request.query_params and
+                self.page_size_query_param not in request.query_params):
+            return None
+
+        self.request = request
+        self.limit = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request)
+
+        cursor = self.decode_cursor(request, queryset)
+        self.reverse = cursor['reverse'] if cursor else False
+
+        # Walking backwards flips both the comparison and the sort order
+        descending = self.descending != self.reverse
+        if cursor is not None:
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': cursor['value']}) |
+                Q(**{self.field: cursor['value'], f'pk__{lookup}': cursor['pk']})
+            )
+
+        prefix = '-' if descending else ''
+        rows = list(queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')[:self.limit + 1])
+
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+
+        if self.reverse:
+            rows.reverse()
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request):
+        """Resolve the requested order_by/direction to an index-backed field
+
+        Returns:
+            tuple -- Field name and whether it sorts descending
+        """
+        field = request.query_params.get(self.ordering_query_param, None)
+        if field in self.ordering_fields:
+            direction = request.query_params.get(self.direction_query_param, None)
+            return field, direction == 'desc'
+
+        return self.default_ordering.lstrip('-'), self.default_ordering.startswith('-')
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+
+        position = json.dumps({
+            'f': self.field,
+            'v': value,
+            'pk': row.pk,
+            'r': reverse,
+        }, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, queryset):
+        """Position a cursor token points at, with its value converted for the ordering field
+
+        Raises:
+            NotFound -- The token is malformed, was made for another ordering
+                or holds a value the field can't take
+        """
+        token = request.query_params.get(self.cursor_query_param, None)
+        if not token:
+            return None
+
+        try:
+            position = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+            field = position['f']
+            # A cursor only makes sense for the ordering it was created with
+            if field != self.field or position['v'] is None:
+                raise ValueError(field)
+            cursor = {
+                'value': queryset.model._meta.get_field(field).to_python(position['v']),
+                'pk': int(position['pk']),
+                'reverse': bool(position['r']),
+            }
+        except (TypeError, ValueError, KeyError, ValidationError, FieldDoesNotExist,
+                binascii.Error, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return cursor
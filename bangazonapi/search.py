@@ -0,0 +1,194 @@
+"""Full-text product search
+
+On PostgreSQL products carry a weighted `search_vector` that is refreshed
+whenever a product is saved and is backed by a GIN index. Other database
+backends fall back to an inverted index held in process memory, built
+lazily on the first search and kept current from the same signals.
+"""
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from bangazonapi.models import Product
+from bangazonapi.models.product import products_bulk_created
+
+
+SEARCH_INDEX_NAME = 'product_search_vector_idx'
+NAME_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def uses_search_vector():
+    """Whether the database can maintain and query tsvector columns"""
+    return connection.vendor == 'postgresql'
+
+
+def product_search_vector():
+    return SearchVector('name', weight='A') + SearchVector('description', weight='B')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+class InvertedIndex:
+    """In-process inverted index over product names and descriptions
+
+    Postings map each token to the products containing it along with a
+    weighted term frequency. Lookups only touch the postings for the query
+    terms, so their cost depends on how common the terms are rather than on
+    the size of the catalog.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.built = False
+
+    def build(self):
+        with self.lock:
+            if self.built:
+                return
+
+            rows = Product.objects.values_list(
+                'id', 'name', 'description').iterator(chunk_size=2000)
+            for product_id, name, description in rows:
+                self._add(product_id, name, description)
+            self.built = True
+
+    def add(self, product_id, name, description):
+        with self.lock:
+            if not self.built:
+                return
+            self._remove(product_id)
+            self._add(product_id, name, description)
+
+    def remove(self, product_id):
+        with self.lock:
+            if self.built:
+                self._remove(product_id)
+
+    def search(self, query, limit):
+        """Rank products containing every query term by TF-IDF
+
+        Returns:
+            list -- Up to `limit` (product id, score) pairs, best first
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        self.build()
+        with self.lock:
+            postings = [self.postings.get(term, {}) for term in terms]
+            if not all(postings):
+                return []
+
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            total = len(self.documents)
+
+            def score(product_id):
+                return sum(
+                    posting[product_id] * math.log(1 + total / len(posting))
+                    for posting in postings
+                )
+
+            ranked = ((score(product_id), -product_id) for product_id in candidates)
+            return [(-negative_id, rank) for rank, negative_id in heapq.nlargest(limit, ranked)]
+
+    def _add(self, product_id, name, description):
+        weights = defaultdict(int)
+        for token in tokenize(name):
+            weights[token] += NAME_WEIGHT
+        for token in tokenize(description):
+            weights[token] += DESCRIPTION_WEIGHT
+
+        for token, weight in weights.items():
+            self.postings[token][product_id] = weight
+        self.documents[product_id] = tuple(weights)
+
+    def _remove(self, product_id):
+        for token in self.documents.pop(product_id, ()):
+            posting = self.postings[token]
+            posting.pop(product_id, None)
+            if not posting:
+                del self.postings[token]
+
+
+product_index = InvertedIndex()
+
+
+def search_products(queryset, query, limit):
+    """Find products matching a free-text query, most relevant first
+
+    Returns:
+        list -- Products from `queryset`, each with a `rank` attribute
+    """
+    if uses_search_vector():
+        search_query = SearchQuery(query, search_type='websearch')
+        return list(
+            queryset.annotate(rank=SearchRank(F('search_vector'), search_query))
+            .filter(search_vector=search_query)
+            .order_by('-rank', 'id')[:limit]
+        )
+
+    ranked = product_index.search(query, limit)
+    products = queryset.in_bulk([product_id for product_id, _ in ranked])
+
+    results = []
+    for product_id, rank in ranked:
+        if product_id in products:
+            product = products[product_id]
+            product.rank = rank
+            results.append(product)
+    return results
+
+
+def create_search_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Create the GIN index and fill in missing vectors after migrate"""
+    if connections[using].vendor != 'postgresql':
+        return
+
+    table = Product._meta.db_table
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX_NAME} '
+            f'ON {table} USING gin (search_vector)'
+        )
+
+    Product.objects.using(using).filter(search_vector__isnull=True).update(
+        search_vector=product_search_vector())
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    if uses_search_vector():
+        Product.objects.filter(pk=instance.pk).update(
+            search_vector=product_search_vector())
+    else:
+        product_index.add(instance.pk, instance.name, instance.description)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    if not uses_search_vector():
+        product_index.remove(instance.pk)
+
+
+@receiver(products_bulk_created)
+def products_imported(sender, products, **kwargs):
+    if uses_search_vector():
+        Product.objects.filter(pk__in=[product.pk for product in products]).update(
+            search_vector=product_search_vector())
+    else:
+        for product in products:
+            product_index.add(product.pk, product.name, product.description)
@@ -0,0 +1,25 @@
+import json
+from rest_framework.test import APITestCase
+
+
+# Customer 7, who has an open order in the fixtures
+TOKEN = 'Token 9ba45f09651c5b0c404f37a2d2572c026c146688'
+
+
+class BangazonTestCase(APITestCase):
+    fixtures = ['users', 'tokens', 'customers', 'product_category', 'product', 'productrating',
+                'payment', 'order', 'order_product', 'favoritesellers']
+
+    def request(self, method, url, data=None, token=TOKEN):
+        body = json.dumps(data) if data is not None else None
+        return getattr(self.client, method)(
+            url, data=body, content_type='application/json', HTTP_AUTHORIZATION=token)
+
+    def walk(self, url, link='next'):
+        """Ids on every page reached by following `link` from `url`"""
+        ids = []
+        while url:
+            page = self.request('get', url).json()
+            ids += [row['id'] for row in page['results']]
+            url = page[link]
+        return ids
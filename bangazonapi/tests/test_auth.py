@@ -0,0 +1,20 @@
+from django.core.cache import caches
+from .base import BangazonTestCase, TOKEN
+
+
+class TokenCacheTests(BangazonTestCase):
+
+    def setUp(self):
+        caches['auth'].clear()
+
+    def test_default_timeout_is_short_for_a_per_process_cache(self):
+        from django.conf import settings
+        if not settings.AUTH_CACHE_SHARED:
+            self.assertLessEqual(settings.CACHES['auth']['TIMEOUT'], 5)
+
+    def test_revoked_tokens_are_rejected_right_away(self):
+        from rest_framework.authtoken.models import Token
+        self.assertEqual(self.request('get', '/profile').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.filter(key=TOKEN.split()[1]).get().delete()
+        self.assertEqual(self.request('get', '/profile').status_code, 401)
@@ -0,0 +1,61 @@
+from django.core.cache import caches
+from django.test import RequestFactory
+from rest_framework.request import Request
+from bangazonapi.cache import catalog_cache, product_tag, PRODUCT_LIST_TAG
+from bangazonapi.models import Product, ProductCategory, ProductRating
+from .base import BangazonTestCase
+
+
+class CatalogCacheTests(BangazonTestCase):
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def test_repeated_reads_are_hits(self):
+        self.request('get', '/products/50')
+        self.request('get', '/products/50')
+        self.request('get', '/products?location=a&category=2')
+        self.request('get', '/products?category=2&location=a')
+        stats = catalog_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 2))
+
+    def test_rating_invalidates_product(self):
+        before = self.request('get', '/products/50').json()['average_rating']
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductRating.objects.create(product_id=50, customer_id=9, rating=5)
+        after = self.request('get', '/products/50').json()['average_rating']
+        self.assertNotEqual(before, after)
+        self.assertEqual(catalog_cache.stats()['stale'], 1)
+
+    def test_moving_a_product_invalidates_old_category(self):
+        product = Product.objects.get(pk=3)
+        old_category = product.category_id
+        url = f'/products?category={old_category}'
+        self.assertIn(3, [row['id'] for row in self.request('get', url).json()])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.category_id = 1 if old_category != 1 else 2
+            product.save()
+        self.assertNotIn(3, [row['id'] for row in self.request('get', url).json()])
+
+    def test_saving_a_product_reads_its_old_category_once(self):
+        product = Product.objects.get(pk=3)
+        product.name = 'Renamed'
+        # Old category, the update, then the category paths to invalidate
+        with self.assertNumQueries(3):
+            product.save()
+
+    def test_renaming_a_category_invalidates_products(self):
+        category_id = Product.objects.get(pk=50).category_id
+        self.request('get', '/products/50')
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductCategory.objects.filter(pk=category_id).update(name='Renamed')
+            ProductCategory.objects.get(pk=category_id).save()
+        self.assertEqual(self.request('get', '/products/50').json()['category']['name'], 'Renamed')
+
+    def test_invalidation_during_a_read_is_not_missed(self):
+        request = Request(RequestFactory().get('/products'))
+        versions = catalog_cache.tag_versions(PRODUCT_LIST_TAG, product_tag(1))
+        catalog_cache.invalidate(product_tag(1))
+        catalog_cache.set(request, ['stale'], versions)
+        self.assertIsNone(catalog_cache.get(request))
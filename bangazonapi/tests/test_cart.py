@@ -0,0 +1,103 @@
+import datetime
+import io
+from unittest import mock
+from django.core.cache import caches
+from django.core.management import call_command
+from django.utils import timezone
+from bangazonapi.models import Order, OrderProduct, StockReservation
+from .base import BangazonTestCase
+
+
+class CartTests(BangazonTestCase):
+
+    def line_item(self, product_id):
+        return OrderProduct.objects.get(order_id=2, product_id=product_id)
+
+    def test_adding_a_product_again_raises_its_quantity(self):
+        self.request('post', '/cart', {'product_id': 40})
+        self.request('post', '/cart', {'product_id': 40, 'quantity': 3})
+        self.assertEqual(self.line_item(40).quantity, 4)
+
+        order = Order.objects.get(pk=2)
+        self.assertEqual(order.item_count, sum(
+            OrderProduct.objects.filter(order=order).values_list('quantity', flat=True)))
+        self.assertEqual(self.request('get', '/cart').json()['size'], order.item_count)
+
+    def test_batch_merges_repeated_products(self):
+        response = self.request('post', '/cart/batch', [
+            {'product_id': 41, 'quantity': 2}, {'product_id': 41}, {'product_id': 42}])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual((self.line_item(41).quantity, self.line_item(42).quantity), (3, 1))
+
+    def test_invalid_quantities_are_rejected(self):
+        self.request('post', '/cart', {'product_id': 40, 'quantity': 2})
+        for quantity in (-3, 0, 'many'):
+            response = self.request('post', '/cart', {'product_id': 40, 'quantity': quantity})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.line_item(40).quantity, 2)
+        self.assertEqual(self.request('post', '/cart', {'product_id': 99999}).status_code, 404)
+
+    def test_queries_do_not_grow_with_the_cart(self):
+        caches['auth'].clear()
+        self.request('get', '/cart')
+        keep = OrderProduct.objects.filter(order_id=2).order_by('pk').first()
+        OrderProduct.objects.filter(order_id=2).exclude(pk=keep.pk).delete()
+
+        for url, key in (('/cart', 'products'), ('/profile/cart', 'line_items')):
+            with self.assertNumQueries(3):
+                self.assertEqual(len(self.request('get', url).json()[key]), 1)
+
+        for product_id in range(60, 69):
+            OrderProduct.objects.create(order_id=2, product_id=product_id, quantity=2)
+        for url, key in (('/cart', 'products'), ('/profile/cart', 'line_items')):
+            with self.assertNumQueries(3):
+                self.assertEqual(len(self.request('get', url).json()[key]), 10)
+
+    def test_removing_takes_one_unit_at_a_time(self):
+        self.request('post', '/cart', {'product_id': 40, 'quantity': 2})
+        self.request('delete', '/cart/40')
+        self.assertEqual(self.line_item(40).quantity, 1)
+        self.request('delete', '/cart/40')
+        self.assertFalse(OrderProduct.objects.filter(order_id=2, product_id=40).exists())
+
+    def test_removing_is_undone_with_the_reservation(self):
+        self.request('post', '/cart?reserve=true', {'product_id': 40, 'quantity': 2})
+        with mock.patch('bangazonapi.views.cart.invalidate_products', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.request('delete', '/cart/40')
+        self.assertEqual(self.line_item(40).quantity, 2)
+        self.assertEqual(StockReservation.objects.get(order_id=2, product_id=40).quantity, 2)
+
+    def test_emptying_the_cart_releases_reservations(self):
+        self.request('post', '/cart?reserve=true', {'product_id': 40})
+        self.assertEqual(self.request('delete', '/profile/cart').status_code, 204)
+        self.assertFalse(Order.objects.filter(pk=2).exists())
+        self.assertFalse(StockReservation.objects.filter(order_id=2).exists())
+
+
+class SweepCartsTests(BangazonTestCase):
+
+    def setUp(self):
+        long_ago = timezone.now() - datetime.timedelta(days=90)
+        Order.objects.open().update(created_date=long_ago.date(), updated=long_ago)
+
+    def test_idle_carts_are_removed(self):
+        call_command('sweep_carts', stdout=io.StringIO())
+        self.assertFalse(Order.objects.open().exists())
+        self.assertFalse(OrderProduct.objects.filter(order_id__in=[2, 8, 9, 10]).exists())
+        self.assertTrue(Order.objects.filter(pk=1).exists())
+
+    def test_recent_activity_keeps_an_old_cart(self):
+        self.request('post', '/cart', {'product_id': 40})
+        call_command('sweep_carts', stdout=io.StringIO())
+        self.assertEqual(list(Order.objects.open().values_list('pk', flat=True)), [2])
+        self.assertEqual(OrderProduct.objects.filter(order_id=2).count(), 4)
+
+    def test_active_reservations_keep_a_cart(self):
+        StockReservation.objects.create(order_id=8, product_id=5, quantity=1,
+                                        expires_at=timezone.now() + datetime.timedelta(minutes=5))
+        StockReservation.objects.create(order_id=9, product_id=1, quantity=1,
+                                        expires_at=timezone.now() - datetime.timedelta(minutes=5))
+        call_command('sweep_carts', stdout=io.StringIO())
+        self.assertEqual(list(Order.objects.open().values_list('pk', flat=True)), [8])
+        self.assertFalse(StockReservation.objects.filter(order_id=9).exists())
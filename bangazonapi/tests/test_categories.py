@@ -0,0 +1,36 @@
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from bangazonapi.models import Product, ProductCategory
+from .base import BangazonTestCase
+
+
+class CategoryTreeTests(BangazonTestCase):
+
+    def setUp(self):
+        caches['catalog'].clear()
+        self.child = ProductCategory.objects.create(name='Hand tools', parent_id=1)
+        self.grandchild = ProductCategory.objects.create(name='Saws', parent=self.child)
+
+    def test_paths_follow_moves(self):
+        self.assertEqual(self.grandchild.path, f'1/{self.child.pk}/{self.grandchild.pk}/')
+        self.child.parent_id = 2
+        self.child.save()
+        self.grandchild.refresh_from_db()
+        self.assertEqual(self.grandchild.path, f'2/{self.child.pk}/{self.grandchild.pk}/')
+
+    def test_subtree_lists_include_subcategory_products(self):
+        Product.objects.filter(pk=3).update(category=self.grandchild)
+        ids = [row['id'] for row in self.request('get', '/products?category=1').json()]
+        self.assertIn(3, ids)
+
+    def test_cycles_are_rejected(self):
+        root = ProductCategory.objects.get(pk=1)
+        for parent in (root, self.grandchild):
+            root.parent = parent
+            with self.assertRaises(ValidationError):
+                root.save()
+        self.assertEqual(ProductCategory.objects.get(pk=1).path, '1/')
+
+    def test_products_show_only_category_id_and_name(self):
+        category = self.request('get', '/products/50').json()['category']
+        self.assertEqual(set(category), {'id', 'name'})
@@ -0,0 +1,64 @@
+import io
+import os
+import tempfile
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APITransactionTestCase
+from bangazonapi.models import Order, OrderProduct, Product
+from .base import BangazonTestCase
+
+
+class CheckoutTests(BangazonTestCase):
+
+    def setUp(self):
+        self.wanted = dict(OrderProduct.objects.filter(order_id=2).values_list('product_id', 'quantity'))
+
+    def stock(self):
+        return dict(Product.objects.filter(pk__in=self.wanted).values_list('pk', 'quantity'))
+
+    def test_paying_takes_the_units_from_stock(self):
+        before = self.stock()
+        with tempfile.TemporaryDirectory() as scratch, \
+                override_settings(COPURCHASE_PATH=os.path.join(scratch, 'copurchase.bin')):
+            response = self.request('put', '/orders/2', {'payment_type': 10})
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.stock(), {pk: before[pk] - self.wanted[pk] for pk in before})
+        self.assertEqual(Order.objects.get(pk=2).payment_type_id, 10)
+
+    def test_short_stock_is_a_conflict(self):
+        short = min(self.wanted)
+        Product.objects.filter(pk=short).update(quantity=0)
+        before = self.stock()
+
+        response = self.request('put', '/orders/2', {'payment_type': 10})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['available'], {str(short): 0})
+        self.assertEqual(self.stock(), before)
+        self.assertIsNone(Order.objects.get(pk=2).payment_type_id)
+
+
+    def test_only_the_customers_own_payment_types(self):
+        before = self.stock()
+        for payment_type in (1, 99999, 'abc', None):
+            response = self.request('put', '/orders/2', {'payment_type': payment_type})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.request('put', '/orders/2', {}).status_code, 400)
+
+        self.assertEqual(self.stock(), before)
+        self.assertIsNone(Order.objects.get(pk=2).payment_type_id)
+
+
+class CheckoutBenchmarkTests(APITransactionTestCase):
+    fixtures = ['users', 'customers', 'product_category', 'product', 'payment', 'order']
+
+    def test_no_oversell_and_nothing_left_behind(self):
+        counts = (Product.objects.count(), Order.objects.count(), OrderProduct.objects.count())
+        with tempfile.TemporaryDirectory() as scratch, \
+                override_settings(COPURCHASE_PATH=os.path.join(scratch, 'copurchase.bin')):
+            call_command('benchmark_checkout', '--orders', '8', '--stock', '5', '--workers', '1',
+                         stdout=io.StringIO())
+            self.assertEqual(os.listdir(scratch), [])
+        self.assertEqual(counts, (Product.objects.count(), Order.objects.count(),
+                                  OrderProduct.objects.count()))
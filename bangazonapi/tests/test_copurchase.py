@@ -0,0 +1,62 @@
+import array
+import io
+import os
+import tempfile
+from django.core.management import call_command
+from django.test import override_settings
+from bangazonapi.copurchase import (
+    CoPurchaseIndex, copurchase_index, count_pairs, discount_logged, record_order, write_matrix
+)
+from bangazonapi.models import OrderProduct
+from .base import BangazonTestCase
+
+
+class RelatedProductsTests(BangazonTestCase):
+
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.path = os.path.join(scratch.name, 'copurchase.bin')
+        settings = override_settings(COPURCHASE_PATH=self.path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        copurchase_index.refresh(force=True)
+
+    def test_product_ids_are_numbers(self):
+        self.assertEqual(self.request('get', '/products/abc/related').status_code, 404)
+
+    def test_unreadable_matrix_means_no_suggestions(self):
+        with open(self.path, 'wb') as matrix_file:
+            matrix_file.write(b'not a matrix' * 4)
+        copurchase_index.checked_at = None
+        with self.assertLogs('bangazonapi.views.product', level='ERROR'):
+            response = self.request('get', '/products/1/related')
+        self.assertEqual((response.status_code, response.json()), (200, []))
+
+    def test_build_counts_paid_orders(self):
+        call_command('build_copurchase', stdout=io.StringIO())
+        paid = OrderProduct.objects.filter(order__payment_type__isnull=False)
+        product_id = paid.values_list('product_id', flat=True).first()
+        orders = paid.filter(product_id=product_id).values('order_id')
+        expected = {
+            other_id: paid.filter(order_id__in=orders, product_id=other_id)
+            .values('order_id').distinct().count()
+            for other_id in paid.filter(order_id__in=orders).exclude(product_id=product_id)
+            .values_list('product_id', flat=True)
+        }
+        self.assertTrue(expected)
+
+        copurchase_index.checked_at = None
+        related = {row['id']: row['bought_together']
+                   for row in self.request('get', f'/products/{product_id}/related?limit=50').json()}
+        self.assertEqual(related, expected)
+
+    def test_orders_in_both_the_read_and_the_log_count_once(self):
+        pairs = count_pairs([(1, 4), (1, 5), (2, 4), (2, 5)])
+        # Order 2 was paid after the log rotation but before the read, order 3 after the read
+        record_order(2, [4, 5], path=self.path)
+        record_order(3, [4, 5], path=self.path)
+
+        self.assertEqual(discount_logged(pairs, array.array('q', [1, 2]), path=self.path), 1)
+        write_matrix(pairs, 10, path=self.path)
+        self.assertEqual(CoPurchaseIndex(self.path).related(4, 10), [(5, 3)])
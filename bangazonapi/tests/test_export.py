@@ -0,0 +1,45 @@
+import csv
+import io
+import json
+from bangazonapi.exporter import EXPORT_FIELDS
+from bangazonapi.models import Order, OrderProduct, Product, ProductStats
+from .base import BangazonTestCase
+
+
+class CatalogExportTests(BangazonTestCase):
+
+    def setUp(self):
+        paid = Order.objects.filter(payment_type__isnull=False).first()
+        self.sold = OrderProduct.objects.create(order=paid, product_id=12, quantity=3)
+
+    def test_rows_are_read_while_streaming(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/products/export')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows],
+                         list(Product.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(list(rows[0]), list(EXPORT_FIELDS))
+
+        sold = ProductStats.objects.get(product_id=self.sold.product_id)
+        exported = next(row for row in rows if row['id'] == sold.product_id)
+        self.assertEqual(exported['number_sold'], sold.units_sold)
+
+    def test_csv(self):
+        response = self.client.get('/products/export?type=csv')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], list(EXPORT_FIELDS))
+        self.assertEqual(len(rows) - 1, Product.objects.count())
+
+    def test_unknown_type(self):
+        self.assertEqual(self.client.get('/products/export?type=xml').status_code, 400)
+
+    def test_category(self):
+        response = self.client.get('/products/export?category=2')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertTrue(rows)
+        self.assertEqual({row['category_id'] for row in rows}, {2})
+        self.assertEqual(self.client.get('/products/export?category=abc').status_code, 400)
@@ -0,0 +1,75 @@
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework.test import APITransactionTestCase
+from bangazonapi import feed
+from bangazonapi.models import Customer, FeedEntry, Product
+from .base import TOKEN, BangazonTestCase
+
+
+class FeedFanOutTests(APITransactionTestCase):
+    fixtures = ['users', 'tokens', 'customers', 'product_category', 'favoritesellers']
+
+    def create_products(self, count, seller_id=5):
+        kites = []
+        for number in range(count):
+            kites.append(Product.objects.create(
+                name=f'Kite {number}', customer_id=seller_id, price=1,
+                description='It flies high', quantity=1, category_id=6, location='Pittsburgh').pk)
+            self.wait_for_fan_out()
+        return kites
+
+    def wait_for_fan_out(self):
+        pool, feed._pool = feed._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def feed_of(self, customer_id):
+        return list(FeedEntry.objects.filter(customer_id=customer_id)
+                    .order_by('-product_id').values_list('product_id', flat=True))
+
+    def read(self):
+        response = self.client.get('/profile/feed', HTTP_AUTHORIZATION=TOKEN)
+        return [product['id'] for product in response.json()['results']]
+
+    def test_new_products_reach_followers(self):
+        kites = self.create_products(2)
+        self.assertEqual(self.feed_of(7), kites[::-1])
+        self.assertEqual(self.read(), kites[::-1])
+
+    def test_own_products_are_not_fanned_out(self):
+        self.create_products(1, seller_id=7)
+        self.assertEqual(self.feed_of(7), [])
+
+    @override_settings(FEED_MAX_ENTRIES=2)
+    def test_feeds_keep_their_newest_entries(self):
+        kites = self.create_products(3)
+        self.assertEqual(self.feed_of(7), kites[:0:-1])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_big_sellers_are_read_from_products(self):
+        Customer.objects.filter(pk=5).update(follower_count=1)
+        kites = self.create_products(2)
+        self.assertEqual(self.feed_of(7), [])
+        self.assertEqual(self.read(), kites[::-1])
+
+
+class FeedReadTests(BangazonTestCase):
+
+    def fill(self, count):
+        FeedEntry.objects.all().delete()
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(customer_id=7, seller_id=5, product_id=product_id)
+             for product_id in range(1, count + 1)])
+
+    def test_queries_do_not_grow_with_the_feed(self):
+        caches['auth'].clear()
+        self.request('get', '/profile')
+        for count in (1, 20):
+            self.fill(count)
+            with self.assertNumQueries(3):
+                page = self.request('get', '/profile/feed').json()
+            self.assertEqual(len(page['results']), count)
+
+    def test_pages_continue_before_the_last_product(self):
+        self.fill(5)
+        self.assertEqual(self.walk('/profile/feed?page_size=2'), [5, 4, 3, 2, 1])
@@ -0,0 +1,48 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from bangazonapi.models import Order, Payment
+from .base import BangazonTestCase
+
+
+class SparseFieldsetTests(BangazonTestCase):
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def test_only_listed_fields_are_rendered(self):
+        rows = self.request('get', '/products?quantity=3&fields=id,name').json()
+        self.assertEqual([set(row) for row in rows], [{'id', 'name'}] * 3)
+        self.assertEqual(self.request('get', '/products/50?fields=id,category.name').json(),
+                         {'id': 50, 'category': {'name': 'Auto'}})
+
+    def test_unrequested_stats_are_not_queried(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.request('get', '/products?quantity=3&fields=id,name')
+        self.assertFalse(any('productstats' in query['sql'] for query in queries))
+
+        caches['catalog'].clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.request('get', '/products?quantity=3&fields=id,number_sold')
+        self.assertTrue(any('productstats' in query['sql'] for query in queries))
+
+    def test_nested_paths_and_expansion(self):
+        Order.objects.filter(pk=2).update(payment_type=10)
+        order = self.request(
+            'get', '/orders/2?fields=id,lineitems.product.name,payment_type&expand=payment_type').json()
+        self.assertEqual(set(order), {'id', 'lineitems', 'payment_type'})
+        self.assertEqual(order['payment_type']['merchant_name'], 'maestro')
+        self.assertEqual({tuple(item) for item in order['lineitems']}, {('product',)})
+        self.assertEqual({tuple(item['product']) for item in order['lineitems']}, {('name',)})
+
+        profile = self.request('get', '/profile?fields=id,payment_types.merchant_name').json()
+        self.assertEqual(profile, {'id': 7, 'payment_types': [
+            {'merchant_name': 'maestro'}, {'merchant_name': 'jcb'}]})
+
+
+class PaymentTypePaginationTests(BangazonTestCase):
+
+    def test_pages_cover_every_payment_type_once(self):
+        expected = list(Payment.objects.order_by('-create_date', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/paymenttypes?page_size=4'), expected)
+        self.assertEqual(self.walk('/paymenttypes?page_size=4&order_by=create_date'), expected[::-1])
@@ -0,0 +1,54 @@
+import io
+import os
+import tempfile
+from concurrent.futures import Future
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APITransactionTestCase
+from bangazonapi import images
+from bangazonapi.models import Product
+from .base import TOKEN
+
+
+class ImageUploadTests(APITransactionTestCase):
+    fixtures = ['users', 'tokens', 'customers', 'product_category']
+
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.media_root = scratch.name
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def wait_for_variants(self):
+        pool, images._pool = images._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def test_multipart_upload_writes_variants(self):
+        upload = io.BytesIO()
+        Image.new('RGB', (800, 400), 'red').save(upload, 'PNG')
+        upload.name = 'kite.png'
+        upload.seek(0)
+
+        response = self.client.post('/products', {
+            'name': 'Kite', 'price': 14.99, 'description': 'It flies high', 'quantity': 3,
+            'location': 'Pittsburgh', 'category_id': 1, 'image_path': upload,
+        }, format='multipart', HTTP_AUTHORIZATION=TOKEN)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['quantity'], response.json()['available']), (3, 3))
+        self.wait_for_variants()
+
+        variants = Product.objects.get(pk=response.json()['id']).image_variants
+        self.assertEqual(set(variants), {'thumbnail', 'thumbnail_webp', 'medium', 'medium_webp'})
+        with Image.open(os.path.join(self.media_root, variants['thumbnail'])) as thumbnail:
+            self.assertEqual(thumbnail.size, (150, 75))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, variants['medium_webp'])))
+
+    def test_failed_variants_are_logged(self):
+        failed = Future()
+        failed.set_exception(OSError('cannot identify image file'))
+        with self.assertLogs('bangazonapi.images', level='ERROR') as logs:
+            images.store_variants(1, failed)
+        self.assertIn('cannot identify image file', logs.output[0])
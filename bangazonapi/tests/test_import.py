@@ -0,0 +1,35 @@
+import json
+from bangazonapi.models import Product
+from .base import BangazonTestCase, TOKEN
+
+
+class BulkImportTests(BangazonTestCase):
+
+    def kite(self, **fields):
+        return dict({'name': 'Kite', 'price': 14.99, 'description': 'It flies high',
+                     'quantity': 60, 'location': 'Pittsburgh', 'category_id': 6}, **fields)
+
+    def test_bad_rows_are_reported_by_position(self):
+        rows = [self.kite(), self.kite(price=-1), self.kite(category_id=999), self.kite(name='Box kite')]
+        response = self.request('post', '/products/bulk?chunk_size=1', rows)
+
+        report = response.json()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((report['created'], report['failed']), (2, 2))
+        self.assertEqual([error['row'] for error in report['errors']], [1, 2])
+        self.assertIn('price', report['errors'][0]['errors'])
+        self.assertIn('category_id', report['errors'][1]['errors'])
+        self.assertEqual(Product.objects.filter(name__in=['Kite', 'Box kite'], customer_id=7).count(), 2)
+
+    def test_malformed_ndjson_lines(self):
+        body = json.dumps(self.kite()) + '\n{"name": \n'
+        response = self.client.post('/products/bulk', data=body, content_type='application/x-ndjson',
+                                    HTTP_AUTHORIZATION=TOKEN)
+        report = response.json()
+        self.assertEqual((report['created'], report['failed']), (1, 1))
+        self.assertEqual(report['errors'][0]['row'], 1)
+        self.assertIn('body', report['errors'][0]['errors'])
+
+    def test_nothing_created_is_a_bad_request(self):
+        response = self.request('post', '/products/bulk', [self.kite(quantity='many')])
+        self.assertEqual((response.status_code, response.json()['created']), (400, 0))
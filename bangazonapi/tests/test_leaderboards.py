@@ -0,0 +1,59 @@
+import io
+from django.core.management import call_command
+from django.test import override_settings
+from bangazonapi.models import LeaderboardEntry, Product, ProductRating
+from .base import BangazonTestCase
+
+
+@override_settings(LEADERBOARD_SIZE=2)
+class LeaderboardTests(BangazonTestCase):
+
+    def setUp(self):
+        LeaderboardEntry.objects.all().delete()
+        self.products = [
+            Product.objects.create(name=name, customer_id=5, price=1, description='Toy', quantity=1,
+                                   category_id=6, location='Pittsburgh')
+            for name in ('Kite', 'Yo-yo', 'Top')
+        ]
+        kite, yoyo, top = self.products
+        self.rate(kite, 5, 5, 5)
+        self.rate(yoyo, 5, 4)
+        self.rate(top, 4)
+
+    def rate(self, product, *ratings):
+        for customer_id, rating in enumerate(ratings, start=4):
+            ProductRating.objects.update_or_create(
+                product=product, customer_id=customer_id, defaults={'rating': rating})
+
+    def board(self, category_id=None):
+        return list(LeaderboardEntry.objects.board(category_id).values_list('product_id', flat=True))
+
+    def test_boards_keep_the_best_scores(self):
+        kite, yoyo, _ = self.products
+        self.assertEqual(self.board(), [kite.pk, yoyo.pk])
+        self.assertEqual(self.board(6), [kite.pk, yoyo.pk])
+        response = self.request('get', '/products/top-rated?category=6')
+        self.assertEqual([row['id'] for row in response.json()], [kite.pk, yoyo.pk])
+
+    def test_a_dropped_score_promotes_the_next_best(self):
+        kite, yoyo, top = self.products
+        self.rate(kite, 0, 0, 0)
+        self.assertEqual(self.board(6), [yoyo.pk, top.pk])
+
+    def test_removing_ratings_frees_the_place(self):
+        kite, yoyo, top = self.products
+        ProductRating.objects.filter(product=kite).delete()
+        self.assertEqual(self.board(6), [yoyo.pk, top.pk])
+
+    def test_moving_a_product_moves_its_boards(self):
+        kite, yoyo, top = self.products
+        kite.category_id = 2
+        kite.save()
+        self.assertEqual(self.board(6), [yoyo.pk, top.pk])
+        self.assertIn(kite.pk, self.board(2))
+        self.assertEqual(self.board(), [kite.pk, yoyo.pk])
+
+    def test_rebuild_matches_incremental_boards(self):
+        boards = {category_id: self.board(category_id) for category_id in (None, 2, 6)}
+        call_command('rebuild_leaderboards', stdout=io.StringIO())
+        self.assertEqual(boards, {category_id: self.board(category_id) for category_id in (None, 2, 6)})
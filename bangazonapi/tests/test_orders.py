@@ -0,0 +1,57 @@
+from django.db import IntegrityError, transaction
+from bangazonapi.models import Customer, Order, OrderProduct
+from .base import BangazonTestCase
+
+
+class OrderHistoryTests(BangazonTestCase):
+
+    def setUp(self):
+        self.paid = [
+            Order.objects.create(customer_id=7, payment_type_id=10, created_date=created_date)
+            for created_date in ('2019-05-01', '2019-06-01')
+        ]
+        for order in self.paid:
+            OrderProduct.objects.create(order=order, product_id=1, quantity=2, unit_price=5)
+            Order.objects.filter(pk=order.pk).refresh_totals()
+
+    def test_summary_by_default(self):
+        page = self.request('get', '/orders').json()
+        self.assertEqual(page['results'][0], {
+            'id': self.paid[1].pk, 'created_date': '2019-06-01', 'payment_type': 10,
+            'item_count': 2, 'total': 10.0,
+        })
+        self.assertEqual({row['id'] for row in page['results']},
+                         {2, *[order.pk for order in self.paid]})
+
+    def test_line_items_on_request(self):
+        orders = self.request('get', '/orders?expand=lineitems').json()
+        nested = {order['id']: order['lineitems'] for order in orders}
+        self.assertEqual([item['quantity'] for item in nested[self.paid[0].pk]], [2])
+        page = self.request('get', '/orders?expand=lineitems&page_size=1').json()
+        self.assertEqual(len(page['results']), 1)
+
+
+class OpenOrderTests(BangazonTestCase):
+
+    def test_one_open_order_per_customer(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Order.objects.create(customer_id=7, created_date='2019-05-01')
+        # Paid orders are not limited
+        Order.objects.create(customer_id=7, payment_type_id=10, created_date='2019-05-01')
+        self.assertEqual(Order.objects.filter(customer_id=7).open().count(), 1)
+
+    def test_get_or_create_open(self):
+        customer = Customer.objects.get(pk=7)
+        self.assertEqual(Order.objects.get_or_create_open(customer).pk, 2)
+
+        Order.objects.filter(pk=2).update(payment_type_id=10)
+        created = Order.objects.get_or_create_open(customer)
+        self.assertNotEqual(created.pk, 2)
+        self.assertIsNone(created.payment_type_id)
+        self.assertEqual(Order.objects.get_or_create_open(customer).pk, created.pk)
+
+    def test_adding_to_the_cart_opens_an_order(self):
+        Order.objects.filter(pk=2).update(payment_type_id=10)
+        self.request('post', '/cart', {'product_id': 40})
+        order = Order.objects.get(customer_id=7, payment_type__isnull=True)
+        self.assertEqual(list(order.lineitems.values_list('product_id', flat=True)), [40])
@@ -0,0 +1,38 @@
+import base64
+import json
+from bangazonapi.models import Product
+from .base import BangazonTestCase
+
+
+class KeysetPaginationTests(BangazonTestCase):
+
+    def test_pages_cover_every_product_once(self):
+        expected = list(Product.objects.order_by('-created_date', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/products?page_size=7'), expected)
+
+    def test_order_by_price(self):
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/products?page_size=9&order_by=price'), expected)
+
+    def test_previous_links_walk_back(self):
+        page = self.request('get', '/products?page_size=40').json()
+        last = self.request('get', page['next']).json()
+        self.assertEqual(self.walk(last['previous'], link='previous')[:40],
+                         [row['id'] for row in page['results']])
+
+    def test_invalid_cursors_are_not_found(self):
+        missing_field = base64.urlsafe_b64encode(b'{"v":"2019-01-01","pk":1,"r":false}').decode()
+        for cursor in ('zzz', missing_field, base64.urlsafe_b64encode(b'[1]').decode()):
+            self.assertEqual(self.request('get', f'/products?cursor={cursor}').status_code, 404)
+
+    def test_cursor_values_the_ordering_field_cannot_take(self):
+        def cursor(value, field='created_date', pk=1):
+            position = json.dumps({'f': field, 'v': value, 'pk': pk, 'r': False})
+            return base64.urlsafe_b64encode(position.encode()).decode()
+
+        for token in (cursor('abc'), cursor(None), cursor([1]), cursor('2019-01-01', pk='x'),
+                      cursor({'a': 1}, field='price')):
+            self.assertEqual(self.request('get', f'/products?cursor={token}').status_code, 404)
+        token = cursor('abc', field='price')
+        self.assertEqual(self.request('get', f'/products?order_by=price&cursor={token}').status_code, 404)
+        self.assertEqual(self.request('get', f'/products?cursor={cursor("2019-01-01")}').status_code, 200)
@@ -0,0 +1,30 @@
+from django.core.cache import caches
+from .base import BangazonTestCase
+
+
+class ProductListTests(BangazonTestCase):
+
+    def setUp(self):
+        # Authenticate once so only the list's own queries are counted
+        caches['auth'].clear()
+        self.request('get', '/profile')
+
+    def listing(self, url):
+        caches['catalog'].clear()
+        return self.request('get', url)
+
+    def test_queries_do_not_grow_with_the_number_of_products(self):
+        for size in (1, 20):
+            with self.assertNumQueries(1):
+                self.assertEqual(len(self.listing(f'/products?quantity={size}').json()), size)
+            with self.assertNumQueries(1):
+                page = self.listing(f'/products?page_size={size}').json()
+            self.assertEqual(len(page['results']), size)
+
+    def test_invalid_filters_are_rejected(self):
+        for url in ('/products?category=abc', '/products?number_sold=x', '/products?number_sold=-1',
+                    '/products?quantity=x', '/products?quantity=2.5'):
+            response = self.listing(url)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertEqual(set(response.json()['errors']), {url.split('?')[1].split('=')[0]})
+        self.assertEqual(len(self.listing('/products?number_sold=0&quantity=3').json()), 3)
@@ -0,0 +1,30 @@
+from django.core.cache import caches
+from bangazonapi.models import Recommendation
+from .base import BangazonTestCase
+
+
+class ProfileTests(BangazonTestCase):
+
+    def recommend(self, count):
+        Recommendation.objects.all().delete()
+        Recommendation.objects.bulk_create(
+            [Recommendation(recommender_id=4 + number % 3, customer_id=7, product_id=number + 1)
+             for number in range(count)] +
+            [Recommendation(recommender_id=7, customer_id=4 + number % 3, product_id=number + 1)
+             for number in range(count)]
+        )
+
+    def test_queries_do_not_grow_with_recommendations(self):
+        caches['auth'].clear()
+        self.request('get', '/profile')
+        for count in (1, 8):
+            self.recommend(count)
+            with self.assertNumQueries(3):
+                profile = self.request('get', '/profile?recommendation_limit=20').json()
+            self.assertEqual((len(profile['recommendations']), len(profile['recommends'])),
+                             (count, count))
+
+    def test_recommendation_limit(self):
+        self.recommend(8)
+        profile = self.request('get', '/profile?recommendation_limit=2').json()
+        self.assertEqual((len(profile['recommendations']), len(profile['recommends'])), (2, 2))
@@ -0,0 +1,48 @@
+import io
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from bangazonapi.models import ProductRating, ProductStats
+from .base import BangazonTestCase
+
+
+class RatingTests(BangazonTestCase):
+
+    def test_rating_again_replaces_the_first_rating(self):
+        response = self.request('post', '/products/2/rate', {'rating': 5})
+        self.assertEqual((response.status_code, response.json()['rating_count']), (201, 1))
+
+        response = self.request('post', '/products/2/rate', {'rating': 1})
+        self.assertEqual((response.status_code, response.json()['previous']), (200, 5))
+        stats = ProductStats.objects.get(product_id=2)
+        self.assertEqual((stats.rating_count, stats.rating_sum, stats.rating_1, stats.rating_5),
+                         (1, 1, 1, 0))
+        self.assertEqual(ProductRating.objects.filter(product_id=2).count(), 1)
+
+    def test_bad_ratings_are_rejected(self):
+        for rating in (9, -1, 4.9, True, '4.5', None):
+            response = self.request('post', '/products/2/rate', {'rating': rating})
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(ProductRating.objects.filter(product_id=2).exists())
+        self.assertEqual(self.request('post', '/products/99999/rate', {'rating': 3}).status_code, 404)
+
+    def test_one_rating_per_customer_and_product(self):
+        existing = ProductRating.objects.first()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ProductRating.objects.create(product_id=existing.product_id,
+                                         customer_id=existing.customer_id, rating=2)
+
+    def test_merging_legacy_ratings(self):
+        existing = ProductRating.objects.first()
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE bangazonapi_rating (id integer PRIMARY KEY, '
+                           'product_id integer, customer_id integer, score integer)')
+            cursor.execute('INSERT INTO bangazonapi_rating VALUES '
+                           '(1, 2, 7, 2), (2, 2, 7, 4), (3, 3, 7, 9), (4, %s, %s, 0)',
+                           [existing.product_id, existing.customer_id])
+
+        output = io.StringIO()
+        call_command('merge_ratings', stdout=output)
+        self.assertIn('merged 1 legacy ratings; skipped 1', output.getvalue())
+        self.assertEqual(ProductRating.objects.get(product_id=2, customer_id=7).rating, 4)
+        self.assertFalse(ProductRating.objects.filter(product_id=3, customer_id=7).exists())
+        self.assertEqual(ProductRating.objects.get(pk=existing.pk).rating, existing.rating)
@@ -0,0 +1,42 @@
+from bangazonapi.models import Recommendation
+from .base import BangazonTestCase
+
+
+class RecommendationInboxTests(BangazonTestCase):
+
+    def setUp(self):
+        self.received = Recommendation.objects.bulk_create([
+            Recommendation(recommender_id=5, customer_id=7, product_id=product_id)
+            for product_id in (1, 2, 12)
+        ])
+
+    def test_recommending_to_many_recipients(self):
+        response = self.request('post', '/products/3/recommend', {'recipients': [5, 6, 8]})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(Recommendation.objects.filter(product_id=3, recommender_id=7).count(), 3)
+        response = self.request('post', '/products/3/recommend', {'recipients': [5, 99999]})
+        self.assertEqual(response.status_code, 404)
+
+    def test_recipients_must_be_distinct_other_customers(self):
+        for recipients in ('56', 5, [5, 'x'], [], [5, 5], [5, 7], {'id': 5}):
+            response = self.request('post', '/products/3/recommend', {'recipients': recipients})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.request('post', '/products/3/recommend', {'recipient': 7}).status_code, 400)
+        self.assertFalse(Recommendation.objects.filter(product_id=3).exists())
+
+        self.assertEqual(self.request('post', '/products/3/recommend', {'recipient': 6}).status_code, 204)
+        self.assertEqual(list(Recommendation.objects.filter(product_id=3).values_list(
+            'customer_id', flat=True)), [6])
+
+    def test_marking_selected_recommendations_as_shown(self):
+        first, second, _ = self.received
+        response = self.request('put', '/profile/recommendations', {'ids': [first.pk, second.pk]})
+        self.assertEqual(response.json(), {'updated': 2})
+        unseen = self.request('get', '/profile/recommendations?shown=false').json()['results']
+        self.assertEqual([row['id'] for row in unseen], [self.received[2].pk])
+
+    def test_ids_must_be_a_list_of_numbers(self):
+        for ids in (str(self.received[0].pk), [self.received[0].pk, 'x'], {'id': 1}):
+            response = self.request('put', '/profile/recommendations', {'ids': ids})
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Recommendation.objects.filter(customer_id=7, is_shown=True).exists())
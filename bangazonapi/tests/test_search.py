@@ -0,0 +1,19 @@
+from bangazonapi.models import Product
+from .base import BangazonTestCase
+
+
+class SearchTests(BangazonTestCase):
+
+    def test_matches_descriptions(self):
+        expected = set(Product.objects.filter(
+            description__icontains='chevrolet').values_list('id', flat=True))
+        response = self.request('get', '/products/search?q=chevrolet')
+        self.assertEqual({row['id'] for row in response.json()}, expected)
+
+    def test_limit_is_clamped(self):
+        response = self.request('get', '/products/search?q=chevrolet&limit=-5')
+        self.assertEqual((response.status_code, len(response.json())), (200, 1))
+
+    def test_bad_input_is_rejected(self):
+        self.assertEqual(self.request('get', '/products/search').status_code, 400)
+        self.assertEqual(self.request('get', '/products/search?q=a&limit=ten').status_code, 400)
@@ -0,0 +1,71 @@
+from unittest import mock
+from rest_framework.test import APITransactionTestCase
+from bangazonapi.models import Order, OrderProduct, Product, ProductRating, ProductStats
+from .base import BangazonTestCase
+
+
+class ProductStatsTests(BangazonTestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Kite', customer_id=5, price=10, description='It flies high', quantity=20,
+            category_id=6, location='Pittsburgh')
+
+    def stats(self):
+        return ProductStats.objects.get(product=self.product)
+
+    def test_ratings_move_the_counters(self):
+        first = ProductRating.objects.create(product=self.product, customer_id=4, rating=4)
+        ProductRating.objects.create(product=self.product, customer_id=5, rating=2)
+        stats = self.stats()
+        self.assertEqual((stats.rating_count, stats.rating_sum, stats.rating_4, stats.rating_2),
+                         (2, 6, 1, 1))
+
+        first.rating = 5
+        first.save()
+        stats = self.stats()
+        self.assertEqual((stats.rating_count, stats.rating_sum, stats.rating_4, stats.rating_5),
+                         (2, 7, 0, 1))
+        self.assertEqual(self.request('get', f'/products/{self.product.pk}').json()['average_rating'], 3.5)
+
+        first.delete()
+        stats = self.stats()
+        self.assertEqual((stats.rating_count, stats.rating_sum, stats.rating_5), (1, 2, 0))
+
+    def test_only_paid_line_items_count_as_sold(self):
+        paid = Order.objects.filter(payment_type__isnull=False).first()
+        OrderProduct.objects.create(order=Order.objects.get(pk=2), product=self.product, quantity=2)
+        self.assertEqual(ProductStats.objects.filter(product=self.product, units_sold__gt=0).count(), 0)
+
+        line_item = OrderProduct.objects.create(order=paid, product=self.product, quantity=3)
+        self.assertEqual((self.stats().units_sold, self.stats().revenue), (3, 30))
+
+        line_item.delete()
+        self.assertEqual((self.stats().units_sold, self.stats().revenue), (0, 0))
+
+    def test_quantity_changes_on_paid_line_items(self):
+        paid = Order.objects.filter(payment_type__isnull=False).first()
+        line_item = OrderProduct.objects.create(order=paid, product=self.product, quantity=3)
+        line_item.quantity = 5
+        line_item.save()
+        self.assertEqual((self.stats().units_sold, self.stats().revenue), (5, 50))
+
+        line_item.quantity = 2
+        line_item.save()
+        self.assertEqual((self.stats().units_sold, self.stats().revenue), (2, 20))
+
+
+class ProductStatsTransactionTests(APITransactionTestCase):
+    fixtures = ['users', 'customers', 'product_category', 'product', 'payment', 'order']
+
+    def test_counters_commit_with_the_write(self):
+        product = Product.objects.get(pk=1)
+        paid = Order.objects.filter(payment_type__isnull=False).first()
+        with mock.patch.object(ProductStats.objects, 'increment', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                ProductRating.objects.create(product=product, customer_id=4, rating=4)
+            with self.assertRaises(RuntimeError):
+                OrderProduct.objects.create(order=paid, product=product, quantity=3)
+
+        self.assertFalse(ProductRating.objects.filter(product=product, customer_id=4).exists())
+        self.assertFalse(OrderProduct.objects.filter(order=paid, product=product).exists())
@@ -0,0 +1,44 @@
+import os
+import tempfile
+from django.test import override_settings
+from bangazonapi.models import Order, OrderProduct, Product
+from .base import BangazonTestCase
+
+
+class OrderTotalsTests(BangazonTestCase):
+
+    def setUp(self):
+        OrderProduct.objects.filter(order_id=2).delete()
+        self.product = Product.objects.get(pk=40)
+        self.price = self.product.price
+
+    def order(self):
+        return Order.objects.get(pk=2)
+
+    def test_line_items_keep_the_price_they_were_added_at(self):
+        self.request('post', '/cart', {'product_id': 40, 'quantity': 2})
+        Product.objects.filter(pk=40).update(price=self.price + 100)
+        self.request('post', '/cart', {'product_id': 41})
+
+        self.assertEqual(OrderProduct.objects.get(order_id=2, product_id=40).unit_price, self.price)
+        price_41 = Product.objects.get(pk=41).price
+        order = self.order()
+        self.assertEqual(order.item_count, 3)
+        self.assertAlmostEqual(order.subtotal, 2 * self.price + price_41)
+
+        self.request('delete', '/cart/41')
+        self.assertEqual((self.order().item_count, round(self.order().subtotal, 2)),
+                         (2, round(2 * self.price, 2)))
+
+    def test_totals_are_frozen_at_checkout(self):
+        # Added before prices were recorded, so charged the price at checkout
+        OrderProduct.objects.create(order_id=2, product=self.product, quantity=2)
+        with tempfile.TemporaryDirectory() as scratch, \
+                override_settings(COPURCHASE_PATH=os.path.join(scratch, 'copurchase.bin')):
+            self.assertEqual(self.request('put', '/orders/2', {'payment_type': 10}).status_code, 204)
+        self.assertAlmostEqual(self.order().subtotal, 2 * self.price)
+
+        OrderProduct.objects.create(order_id=2, product_id=41, quantity=1, unit_price=1)
+        Product.objects.filter(pk=40).update(price=self.price + 100)
+        self.assertEqual(self.order().item_count, 2)
+        self.assertAlmostEqual(self.order().subtotal, 2 * self.price)
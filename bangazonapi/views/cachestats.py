@@ -0,0 +1,36 @@
+"""View module for reporting catalog cache counters"""
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from bangazonapi.cache import catalog_cache
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """
+    @api {GET} /cachestats GET catalog cache counters
+    @apiName GetCacheStats
+    @apiGroup Cache
+
+    @apiHeader {String} Authorization Auth token of a staff user
+    @apiHeaderExample {String} Authorization
+        Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+    @apiSuccess (200) {Number} hits Requests answered from the cache, across all workers
+        sharing the cache backend
+    @apiSuccess (200) {Number} misses Requests that had to be built from the database
+    @apiSuccess (200) {Number} stale Entries dropped because a tag they depend on changed
+        (misses include these; backend evictions are not counted)
+    @apiSuccess (200) {Number} invalidations Tags invalidated by catalog changes
+    @apiSuccess (200) {String} backend Cache backend in use
+    @apiSuccessExample {json} Success
+        {
+            "hits": 120,
+            "misses": 14,
+            "stale": 3,
+            "invalidations": 9,
+            "backend": "LocMemCache"
+        }
+    """
+    return Response(catalog_cache.stats())
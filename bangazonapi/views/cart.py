@@ -1,11 +1,86 @@
 """View module for handling requests about park areas"""
-import datetime
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
+from rest_framework.decorators import action
+from rest_framework import serializers
 from rest_framework import status
-from bangazonapi.models import Order, Customer, Product, OrderProduct
-from .product import ProductSerializer
-from .order import OrderSerializer
+from bangazonapi.cache import invalidate_products
+from bangazonapi.checkout import OutOfStock, reserve_stock
+from bangazonapi.models import Order, Product, OrderProduct, StockReservation
+from bangazonapi.fieldsets import SparseFieldsMixin, field_expanded, field_requested
+from .order import OrderLineItemSerializer
+from .paymenttype import PaymentSerializer
+from .product import ProductSerializer, product_queryset
+
+
+class CartItemSerializer(serializers.Serializer):
+    """Validates one product and quantity of a batch cart update"""
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """JSON serializer for a customer's open order"""
+    expandable_fields = {'payment_type': PaymentSerializer}
+
+    line_items = OrderLineItemSerializer(source='lineitems', many=True)
+    size = serializers.IntegerField(source='item_count')
+
+    class Meta:
+        model = Order
+        fields = ('id', 'created_date', 'payment_type', 'customer',
+                  'line_items', 'size', 'subtotal')
+
+
+class CartProductSerializer(ProductSerializer):
+    """JSON serializer for a product in the cart along with how many are in it"""
+    cart_quantity = serializers.IntegerField()
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ('cart_quantity',)
+
+
+class CartProductsSerializer(CartSerializer):
+    """JSON serializer for the open order with its products listed directly"""
+    products = CartProductSerializer(source='cart_products', many=True)
+
+    class Meta(CartSerializer.Meta):
+        fields = ('id', 'created_date', 'payment_type', 'customer',
+                  'size', 'subtotal', 'products')
+
+
+def get_cart(request, products='line_items.product'):
+    """Open order for the requesting user, ready for CartSerializer
+
+    The order, which stores its own totals, comes back in one query and the
+    line items, products and product stats in two prefetch queries, whatever
+    the size of the cart.
+
+    Arguments:
+        products {str} -- Dotted path of the products within the response
+
+    Raises:
+        Order.DoesNotExist -- If the user has no open order
+    """
+    orders = Order.objects.all()
+    if field_requested(request, products):
+        orders = orders.with_line_items(product_queryset(request, products))
+    if field_expanded(request, 'payment_type'):
+        orders = orders.select_related('payment_type')
+
+    return orders.open().get(customer=request.customer)
+
+
+def wants_reservation(request):
+    return request.query_params.get('reserve', '').lower() in ('1', 'true')
+
+
+def out_of_stock_response(ex):
+    return Response({'message': str(ex), 'available': ex.shortages},
+                    status=status.HTTP_409_CONFLICT)
 
 
 class Cart(ViewSet):
@@ -20,25 +95,82 @@ class Cart(ViewSet):
         @apiSuccessExample {json} Success
             HTTP/1.1 204 No Content
         @apiParam {Number} product_id Id of product to add
+        @apiParam {Number} quantity How many to add (default 1)
+        @apiParam {Boolean} reserve Query parameter; true holds the product's units in
+            the cart for a limited time
+        @apiError (400) {Object} errors Validation errors for the product id or quantity
+        @apiError (404) {String} message Product that does not exist
+        @apiError (409) {Object} available Units still available for each product that is short
         """
-        current_user = Customer.objects.get(user=request.auth.user)
+        serializer = CartItemSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            open_order = Order.objects.get(
-                customer=current_user, payment_type__isnull=True)
-        except Order.DoesNotExist as ex:
-            open_order = Order()
-            open_order.created_date = datetime.datetime.now()
-            open_order.customer = current_user
-            open_order.save()
+        product_id = serializer.validated_data["product_id"]
+        quantity = serializer.validated_data["quantity"]
+        if not Product.objects.filter(pk=product_id).exists():
+            return Response({'message': 'Product not found'},
+                            status=status.HTTP_404_NOT_FOUND)
 
-        line_item = OrderProduct()
-        line_item.product = Product.objects.get(pk=request.data["product_id"])
-        line_item.order = open_order
-        line_item.save()
+        current_user = request.customer
+
+        try:
+            with transaction.atomic():
+                open_order = Order.objects.get_or_create_open(current_user)
+                OrderProduct.objects.add_to_order(open_order.id, {product_id: quantity})
+                if wants_reservation(request):
+                    reserve_stock(open_order.id, [product_id])
+        except OutOfStock as ex:
+            return out_of_stock_response(ex)
 
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
+    @action(methods=['post'], detail=False)
+    def batch(self, request):
+        """
+        @api {POST} /cart/batch POST many products to cart at once
+        @apiName AddLineItems
+        @apiGroup ShoppingCart
+
+        @apiParamExample {json} Input
+            [
+                {"product_id": 52, "quantity": 5},
+                {"product_id": 33, "quantity": 1}
+            ]
+        @apiSuccessExample {json} Success
+            HTTP/1.1 204 No Content
+        @apiParam {Boolean} reserve Query parameter; true holds the products' units in
+            the cart for a limited time
+        @apiError (400) {Object[]} errors Validation errors for each entry
+        @apiError (404) {String} message Products that do not exist
+        @apiError (409) {Object} available Units still available for each product that is short
+        """
+        serializer = CartItemSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        quantities = defaultdict(int)
+        for item in serializer.validated_data:
+            quantities[item["product_id"]] += item["quantity"]
+
+        found = Product.objects.filter(pk__in=quantities).values_list('pk', flat=True)
+        missing = sorted(set(quantities) - set(found))
+        if missing:
+            return Response({'message': f'Products not found: {missing}'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        current_user = request.customer
+
+        try:
+            with transaction.atomic():
+                open_order = Order.objects.get_or_create_open(current_user)
+                OrderProduct.objects.add_to_order(open_order.id, dict(quantities))
+                if wants_reservation(request):
+                    reserve_stock(open_order.id, list(quantities))
+        except OutOfStock as ex:
+            return out_of_stock_response(ex)
+
+        return Response({}, status=status.HTTP_204_NO_CONTENT)
 
     def destroy(self, request, pk=None):
         """
@@ -46,19 +178,26 @@ class Cart(ViewSet):
         @apiName RemoveLineItem
         @apiGroup ShoppingCart
 
-        @apiParam {id} id Product Id to remove from cart
+        @apiParam {id} id Product Id to remove one unit of from cart
         @apiSuccessExample {json} Success
             HTTP/1.1 204 No Content
         """
-        current_user = Customer.objects.get(user=request.auth.user)
-        open_order = Order.objects.get(
-            customer=current_user, payment_type=None)
+        current_user = request.customer
+        open_order = Order.objects.open().get(customer=current_user)
 
-        line_item = OrderProduct.objects.filter(
-            product__id=pk,
-            order=open_order
-        )[0]
-        line_item.delete()
+        with transaction.atomic():
+            # Remove one unit, and the whole line item along with the last one
+            line_items = OrderProduct.objects.filter(product__id=pk, order=open_order)
+            if line_items.filter(quantity__gt=1).update(quantity=F('quantity') - 1):
+                Order.objects.filter(pk=open_order.pk).refresh_totals(touch=True)
+            else:
+                line_items[0].delete()
+
+            # A reservation never holds more than is left in the cart
+            reservations = StockReservation.objects.filter(product__id=pk, order=open_order)
+            if reservations.filter(quantity__gt=1).update(quantity=F('quantity') - 1) \
+                    or reservations.delete()[0]:
+                invalidate_products([int(pk)])
 
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
@@ -75,9 +214,9 @@ class Cart(ViewSet):
         @apiSuccess (200) {Object} payment_type Payment id use to complete order
         @apiSuccess (200) {String} customer URI for customer
         @apiSuccess (200) {Number} size Number of items in cart
-        @apiSuccess (200) {Object[]} line_items Line items in cart
-        @apiSuccess (200) {Number} line_items.id Line item id
-        @apiSuccess (200) {Object} line_items.product Product in cart
+        @apiSuccess (200) {Number} subtotal Summed price of the items in cart
+        @apiSuccess (200) {Object[]} products Products in cart
+        @apiSuccess (200) {Number} products.cart_quantity How many of the product are in cart
         @apiSuccessExample {json} Success
             {
                 "id": 2,
@@ -101,33 +240,24 @@ class Cart(ViewSet):
                         "category": {
                             "url": "http://localhost:8000/productcategories/2",
                             "name": "Auto"
-                        }
+                        },
+                        "cart_quantity": 1
                     }
                 ],
-                "size": 1
+                "size": 1,
+                "subtotal": 1296.98
             }
         """
-        current_user = Customer.objects.get(user=request.auth.user)
         try:
-            open_order = Order.objects.get(
-                customer=current_user, payment_type=None)
-
-            products_on_order = Product.objects.filter(
-                line_items__order=open_order)
-
-            serialized_order = OrderSerializer(
-                open_order, many=False, context={'request': request})
-
-            product_list = ProductSerializer(
-                products_on_order, many=True, context={'request': request})
-
-            final = {
-                "order": serialized_order.data
-            }
-            final["order"]["products"] = product_list.data
-            final["order"]["size"] = len(products_on_order)
-
+            open_order = get_cart(request, products='products')
         except Order.DoesNotExist as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
 
-        return Response(final["order"])
+        open_order.cart_products = []
+        if field_requested(request, 'products'):
+            for line_item in open_order.lineitems.all():
+                line_item.product.cart_quantity = line_item.quantity
+                open_order.cart_products.append(line_item.product)
+
+        cart = CartProductsSerializer(open_order, context={'request': request})
+        return Response(cart.data)
@@ -1,17 +1,22 @@
 
 """View module for handling requests about line items"""
+from django.db import transaction
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
-from bangazonapi.models import OrderProduct, Customer
+from bangazonapi.fieldsets import SparseFieldsMixin, field_expanded
+from bangazonapi.models import OrderProduct
+from .product import ProductSerializer, product_queryset
 
 
-class LineItemSerializer(serializers.ModelSerializer):
+class LineItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for line items """
+    expandable_fields = {'product': ProductSerializer}
+
     class Meta:
         model = OrderProduct
-        fields = ('id', 'url', 'order', 'product')
+        fields = ('id', 'url', 'order', 'product', 'quantity', 'unit_price')
 
 class LineItems(ViewSet):
     """Line items for Bangazon orders"""
@@ -31,8 +36,11 @@ class LineItems(ViewSet):
             HTTP/1.1 204 No Content
         """
         try:
-            customer = Customer.objects.get(user=request.auth.user)
-            line_item = OrderProduct.objects.get(pk=pk, order__customer=customer)
+            customer = request.customer
+            line_items = OrderProduct.objects.all()
+            if field_expanded(request, 'product'):
+                line_items = line_items.with_product_stats(product_queryset(request, 'product'))
+            line_item = line_items.get(pk=pk, order__customer=customer)
 
             serializer = LineItemSerializer(line_item, context={'request': request})
 
@@ -56,9 +64,12 @@ class LineItems(ViewSet):
             HTTP/1.1 204 No Content
         """
         try:
-            customer = Customer.objects.get(user=request.auth.user)
-            order_product = OrderProduct.objects.get(pk=pk, order__customer=customer)
-            order_product.delete()
+            customer = request.customer
+
+            with transaction.atomic():
+                order_product = OrderProduct.objects.select_related(
+                    'order', 'product').get(pk=pk, order__customer=customer)
+                order_product.delete()
 
             return Response({}, status=status.HTTP_204_NO_CONTENT)
 
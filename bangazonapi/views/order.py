@@ -6,28 +6,60 @@ from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
 from rest_framework.decorators import action
-from bangazonapi.models import Order, Payment, Customer, Product, OrderProduct
-from .product import ProductSerializer
+from bangazonapi.checkout import OutOfStock, checkout
+from bangazonapi.models import Order, Payment, Product, OrderProduct
+from bangazonapi.fieldsets import SparseFieldsMixin, field_expanded, field_requested
+from bangazonapi.pagination import KeysetPagination
+from .paymenttype import PaymentSerializer
+from .product import ProductSerializer, product_queryset
 
 
-class OrderLineItemSerializer(serializers.ModelSerializer):
+class OrderLineItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for line items """
 
     product = ProductSerializer(many=False)
 
     class Meta:
         model = OrderProduct
-        fields = ('id', 'product')
+        fields = ('id', 'product', 'quantity', 'unit_price')
         depth = 1
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for customer orders"""
+    expandable_fields = {'payment_type': PaymentSerializer}
 
     lineitems = OrderLineItemSerializer(many=True)
 
     class Meta:
         model = Order
-        fields = ('id', 'created_date', 'payment_type', 'customer', 'lineitems')
+        fields = ('id', 'created_date', 'payment_type', 'customer', 'lineitems',
+                  'item_count', 'subtotal')
+
+
+class OrderSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """JSON serializer for order history rows, without line items"""
+    expandable_fields = {'payment_type': PaymentSerializer}
+
+    total = serializers.FloatField(source='subtotal')
+
+    class Meta:
+        model = Order
+        fields = ('id', 'created_date', 'payment_type', 'item_count', 'total')
+
+
+def order_queryset(orders, request, line_items='lineitems'):
+    """Orders with only the related rows the response needs
+
+    Arguments:
+        orders {QuerySet} -- Orders to add prefetches to
+        request -- Request whose `fields` and `expand` parameters decide what is rendered
+        line_items {str} -- Name of the line item list within the response
+    """
+    if field_requested(request, line_items):
+        orders = orders.with_line_items(product_queryset(request, f'{line_items}.product'))
+    if field_expanded(request, 'payment_type'):
+        orders = orders.select_related('payment_type')
+    return orders
 
 
 class Orders(ViewSet):
@@ -49,6 +81,8 @@ class Orders(ViewSet):
         @apiSuccess (200) {String} created_date Date order was created
         @apiSuccess (200) {String} payment_type Payment URI
         @apiSuccess (200) {String} customer Customer URI
+        @apiSuccess (200) {Number} item_count Number of units on the order
+        @apiSuccess (200) {Number} subtotal Summed price of the units, as added to the order
 
         @apiSuccessExample {json} Success
             {
@@ -56,12 +90,14 @@ class Orders(ViewSet):
                 "url": "http://localhost:8000/orders/1",
                 "created_date": "2019-08-16",
                 "payment_type": "http://localhost:8000/paymenttypes/1",
-                "customer": "http://localhost:8000/customers/5"
+                "customer": "http://localhost:8000/customers/5",
+                "item_count": 3,
+                "subtotal": 54.97
             }
         """
         try:
-            customer = Customer.objects.get(user=request.auth.user)
-            order = Order.objects.get(pk=pk, customer=customer)
+            customer = request.customer
+            order = order_queryset(Order.objects.all(), request).get(pk=pk, customer=customer)
             serializer = OrderSerializer(order, context={'request': request})
             return Response(serializer.data)
 
@@ -93,11 +129,31 @@ class Orders(ViewSet):
 
         @apiSuccessExample {json} Success
             HTTP/1.1 204 No Content
+        @apiError (400) {String} message Payment type missing or not the customer's own
+        @apiError (404) {String} message Order not found
+        @apiError (409) {String} message Not enough stock to complete the order
+        @apiError (409) {Object} available Units still in stock for each product that is short
+        @apiErrorExample {json} Error
+            {
+                "message": "Not enough stock to complete the order",
+                "available": {
+                    "52": 1
+                }
+            }
         """
-        customer = Customer.objects.get(user=request.auth.user)
-        order = Order.objects.get(pk=pk, customer=customer)
-        order.payment_type = request.data["payment_type"]
-        order.save()
+        customer = request.customer
+
+        try:
+            checkout(pk, customer, request.data.get("payment_type", None))
+        except Order.DoesNotExist as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+        except Payment.DoesNotExist:
+            return Response({'message': 'payment_type must be one of your payment types'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        except OutOfStock as ex:
+            return Response(
+                {'message': str(ex), 'available': ex.shortages},
+                status=status.HTTP_409_CONFLICT)
 
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
@@ -112,33 +168,79 @@ class Orders(ViewSet):
             Token 9ba45f09651c5b0c404f37a2d2572c026c146611
 
         @apiParam {id} payment_id Query param to filter by payment used
-
-        @apiSuccess (200) {Object[]} orders Array of order objects
-        @apiSuccess (200) {id} orders.id Order id
-        @apiSuccess (200) {String} orders.url Order URI
-        @apiSuccess (200) {String} orders.created_date Date order was created
-        @apiSuccess (200) {String} orders.payment_type Payment URI
-        @apiSuccess (200) {String} orders.customer Customer URI
+        @apiParam {String} cursor Opaque cursor from a previous page's next/previous link
+        @apiParam {Number} page_size Number of orders per page
+        @apiParam {String} expand lineitems for the full orders with nested line items
+            (paginated only when cursor or page_size is sent), payment_type to nest the
+            payment type instead of its id
+        @apiParam {String} fields Comma-separated dotted paths of the fields to return,
+            e.g. id,lineitems.product.name
+
+        @apiSuccess (200) {Object[]} results Page of orders, newest first
+        @apiSuccess (200) {id} results.id Order id
+        @apiSuccess (200) {String} results.created_date Date order was created
+        @apiSuccess (200) {Number} results.payment_type Payment type id
+        @apiSuccess (200) {Number} results.item_count Number of items on the order
+        @apiSuccess (200) {Number} results.total Order total
 
         @apiSuccessExample {json} Success
+            {
+                "next": "http://localhost:8000/orders?cursor=eyJmIjoi",
+                "previous": null,
+                "results": [
+                    {
+                        "id": 1,
+                        "created_date": "2019-08-16",
+                        "payment_type": 1,
+                        "item_count": 3,
+                        "total": 54.97
+                    }
+                ]
+            }
+        @apiSuccessExample {json} Expanded
             [
                 {
                     "id": 1,
-                    "url": "http://localhost:8000/orders/1",
                     "created_date": "2019-08-16",
-                    "payment_type": "http://localhost:8000/paymenttypes/1",
-                    "customer": "http://localhost:8000/customers/5"
+                    "payment_type": 1,
+                    "customer": 5,
+                    "lineitems": [],
+                    "item_count": 0,
+                    "subtotal": 0.0
                 }
             ]
         """
-        customer = Customer.objects.get(user=request.auth.user)
-        orders = Order.objects.filter(customer=customer)
+        orders = Order.objects.filter(customer=request.customer)
 
         payment = self.request.query_params.get('payment_id', None)
         if payment is not None:
-            orders = orders.filter(payment__id=payment)
+            orders = orders.filter(payment_type__id=payment)
+
+        # Line items are left to GET /orders/:id unless asked for
+        if not field_expanded(request, 'lineitems'):
+            return self.list_summary(request, orders)
+
+        orders = order_queryset(orders, request)
+
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        if page is not None:
+            json_orders = OrderSerializer(page, many=True, context={'request': request})
+            return paginator.get_paginated_response(json_orders.data)
 
         json_orders = OrderSerializer(
             orders, many=True, context={'request': request})
 
         return Response(json_orders.data)
+
+    def list_summary(self, request, orders):
+        """One page of order history, read from the orders' stored totals"""
+        orders = orders.only('id', 'created_date', 'payment_type', 'item_count', 'subtotal')
+        if field_expanded(request, 'payment_type'):
+            orders = orders.select_related('payment_type')
+
+        paginator = KeysetPagination(always=True)
+        page = paginator.paginate_queryset(orders, request, view=self)
+        serializer = OrderSummarySerializer(page, many=True, context={'request': request})
+
+        return paginator.get_paginated_response(serializer.data)
@@ -4,7 +4,9 @@ from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
-from bangazonapi.models import Payment, Customer
+from bangazonapi.models import Payment
+from bangazonapi.fieldsets import SparseFieldsMixin
+from bangazonapi.pagination import KeysetPagination
 
 '''
 auther: Tyler Carpenter
@@ -13,7 +15,7 @@ methods: all
 '''
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for Payment
 
     Arguments:
@@ -38,7 +40,7 @@ class Payments(ViewSet):
         new_payment.account_number = request.data["account_number"]
         new_payment.expiration_date = request.data["expiration_date"]
         new_payment.create_date = request.data["create_date"]
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
         new_payment.customer = customer
         new_payment.save()
 
@@ -91,6 +93,13 @@ class Payments(ViewSet):
         if payment_type is not None:
             payment_types = payment_types.filter(customer__id=payment_type)
 
+        paginator = KeysetPagination(
+            ordering_fields=('create_date',), default_ordering='-create_date')
+        page = paginator.paginate_queryset(payment_types, request, view=self)
+        if page is not None:
+            serializer = PaymentSerializer(page, many=True, context={'request': request})
+            return paginator.get_paginated_response(serializer.data)
+
         serializer = PaymentSerializer(
             payment_types, many=True, context={'request': request})
         return Response(serializer.data)
\ No newline at end of file
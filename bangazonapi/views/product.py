@@ -1,27 +1,66 @@
 """View module for handling requests about park areas"""
 from bangazonapi.models.recommendation import Recommendation
 import base64
+import io
+import logging
+from django.conf import settings
 from django.core.files.base import ContentFile
-from django.http import HttpResponseServerError
+from django.core.files.storage import default_storage
+from django.http import HttpResponseServerError, StreamingHttpResponse
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import serializers
 from rest_framework import status
-from bangazonapi.models import Product, Customer, ProductCategory
+from bangazonapi.models import Product, Customer, ProductCategory, LeaderboardEntry
+from bangazonapi.models import ProductRating, ProductStats
+from bangazonapi.models.productstats import RATING_SCORES
+from bangazonapi.images import schedule_variants
+from bangazonapi.cache import (
+    catalog_cache, category_tag, product_tag, CATEGORY_LIST_TAG, PRODUCT_LIST_TAG
+)
+from bangazonapi.copurchase import copurchase_index
+from bangazonapi.fieldsets import SparseFieldsMixin, field_requested
+from bangazonapi.exporter import CONTENT_TYPES, EXPORT_WRITERS, export_rows
+from bangazonapi.importer import ProductImport, iter_json_array, iter_ndjson
+from bangazonapi.pagination import KeysetPagination
+from bangazonapi.search import search_products
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.parsers import MultiPartParser, FormParser
 
 
-class ProductSerializer(serializers.ModelSerializer):
+logger = logging.getLogger(__name__)
+
+
+class ProductCategorySummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """JSON serializer for the category nested in a product"""
+
+    class Meta:
+        model = ProductCategory
+        fields = ('id', 'name')
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for products"""
+    image_variants = serializers.SerializerMethodField()
+    category = ProductCategorySummarySerializer(many=False, read_only=True)
+
     class Meta:
         model = Product
         fields = ('id', 'name', 'price', 'number_sold', 'description',
-                  'quantity', 'created_date', 'location', 'image_path',
-                  'average_rating', 'can_be_rated', 'category',)
+                  'quantity', 'available', 'created_date', 'location', 'image_path',
+                  'image_variants', 'average_rating', 'can_be_rated', 'category',)
         depth = 1
 
+    def get_image_variants(self, obj):
+        """URLs of the resized copies of the product image, once generated"""
+        request = self.context.get('request', None)
+        urls = {}
+        for name, path in obj.image_variants.items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
+
     # def validate_price(self, value):
     #     """
     #     Check that the blog post is about Django.
@@ -31,6 +70,67 @@ class ProductSerializer(serializers.ModelSerializer):
     #     return value
 
 
+class RecommendSerializer(serializers.Serializer):
+    """Validates the customers a product is recommended to"""
+    recipients = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                       allow_empty=False)
+    recipient = serializers.IntegerField(required=False)
+
+    def validate_recipients(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError("Recipients are listed more than once")
+        return value
+
+    def validate(self, attrs):
+        if 'recipients' not in attrs:
+            if 'recipient' not in attrs:
+                raise serializers.ValidationError("Give recipients or a recipient")
+            attrs['recipients'] = [attrs['recipient']]
+        if self.context['request'].user.id in attrs['recipients']:
+            raise serializers.ValidationError("Products can't be recommended to yourself")
+        return attrs
+
+
+class RateSerializer(serializers.Serializer):
+    """Validates a customer's rating of a product"""
+    rating = serializers.IntegerField(min_value=min(RATING_SCORES), max_value=max(RATING_SCORES))
+
+
+class CategoryFilterSerializer(serializers.Serializer):
+    """Validates the category query parameter of product listings"""
+    category = serializers.IntegerField(required=False)
+
+
+class ProductFilterSerializer(CategoryFilterSerializer):
+    """Validates the query parameters that narrow the product list"""
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    number_sold = serializers.IntegerField(min_value=0, required=False)
+
+
+STATS_FIELDS = ('number_sold', 'average_rating')
+
+
+def product_queryset(request, prefix='', ordering=None):
+    """Products with only the joins and annotations the response needs
+
+    Arguments:
+        request -- Request whose `fields` parameter decides what is rendered
+        prefix {str} -- Dotted path of the products within the response
+        ordering {str} -- Field the products will be sorted by, if any
+    """
+    def wanted(name):
+        return name == ordering or field_requested(request, f'{prefix}.{name}' if prefix else name)
+
+    products = Product.objects.all()
+    if any(wanted(name) for name in STATS_FIELDS):
+        products = products.with_stats()
+    if wanted('available'):
+        products = products.with_availability()
+    if wanted('category'):
+        products = products.select_related('category')
+    return products
+
+
 class Products(ViewSet):
     """Request handlers for Products in the Bangazon Platform"""
     permission_classes = (IsAuthenticatedOrReadOnly,)
@@ -51,6 +151,8 @@ class Products(ViewSet):
         @apiParam {Number} quantity Number of items to sell
         @apiParam {String} location City where product is located
         @apiParam {Number} category_id Category of product
+        @apiParam {File} image_path Product image, sent as a multipart/form-data file
+            part (preferred) or as a base64 data URI in a JSON body
         @apiParamExample {json} Input
             {
                 "name": "Kite",
@@ -67,9 +169,11 @@ class Products(ViewSet):
         @apiSuccess (200) {String} product.description Long form description of product
         @apiSuccess (200) {Number} product.price Cost of product
         @apiSuccess (200) {Number} product.quantity Number of items to sell
+        @apiSuccess (200) {Number} product.available Items in stock that are not reserved in a cart
         @apiSuccess (200) {Date} product.created_date City where product is located
         @apiSuccess (200) {String} product.location City where product is located
         @apiSuccess (200) {String} product.image_path Path to product image
+        @apiSuccess (200) {Object} product.image_variants URLs of thumbnail/medium (JPEG and WebP) copies, filled in once resizing finishes
         @apiSuccess (200) {Number} product.average_rating Average customer rating of product
         @apiSuccess (200) {Number} product.number_sold How many items have been purchased
         @apiSuccess (200) {Object} product.category Category of product
@@ -82,9 +186,11 @@ class Products(ViewSet):
                 "number_sold": 0,
                 "description": "It flies high",
                 "quantity": 60,
+                "available": 60,
                 "created_date": "2019-10-23",
                 "location": "Pittsburgh",
                 "image_path": null,
+                "image_variants": {},
                 "average_rating": 0,
                 "category": {
                     "url": "http://localhost:8000/productcategories/6",
@@ -99,13 +205,18 @@ class Products(ViewSet):
         new_product.quantity = request.data["quantity"]
         new_product.location = request.data["location"]
 
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
         new_product.customer = customer
 
         product_category = ProductCategory.objects.get(pk=request.data["category_id"])
         new_product.category = product_category
 
-        if "image_path" in request.data:
+        if "image_path" in request.FILES:
+            # Multipart uploads have already been streamed to a temporary
+            # file, which storage moves into place without reading it whole
+            new_product.image_path = request.FILES["image_path"]
+
+        elif "image_path" in request.data:
             format, imgstr = request.data["image_path"].split(';base64,')
             ext = format.split('/')[-1]
             data = ContentFile(base64.b64decode(imgstr), name=f'{new_product.id}-{request.data["name"]}.{ext}')
@@ -118,6 +229,10 @@ class Products(ViewSet):
         # If the data is valid, save the product
         if serializer.is_valid():
             new_product.save()
+            schedule_variants(new_product)
+
+            # Nothing can be reserved yet on a product that was just created
+            new_product.available = serializer.validated_data['quantity']
 
             serializer = ProductSerializer(
                 new_product, context={'request': request})
@@ -143,9 +258,11 @@ class Products(ViewSet):
         @apiSuccess (200) {String} product.description Long form description of product
         @apiSuccess (200) {Number} product.price Cost of product
         @apiSuccess (200) {Number} product.quantity Number of items to sell
+        @apiSuccess (200) {Number} product.available Items in stock that are not reserved in a cart
         @apiSuccess (200) {Date} product.created_date City where product is located
         @apiSuccess (200) {String} product.location City where product is located
         @apiSuccess (200) {String} product.image_path Path to product image
+        @apiSuccess (200) {Object} product.image_variants URLs of thumbnail/medium (JPEG and WebP) copies, filled in once resizing finishes
         @apiSuccess (200) {Number} product.average_rating Average customer rating of product
         @apiSuccess (200) {Number} product.number_sold How many items have been purchased
         @apiSuccess (200) {Object} product.category Category of product
@@ -158,9 +275,11 @@ class Products(ViewSet):
                 "number_sold": 0,
                 "description": "It flies high",
                 "quantity": 60,
+                "available": 60,
                 "created_date": "2019-10-23",
                 "location": "Pittsburgh",
                 "image_path": null,
+                "image_variants": {},
                 "average_rating": 0,
                 "category": {
                     "url": "http://localhost:8000/productcategories/6",
@@ -168,9 +287,19 @@ class Products(ViewSet):
                 }
             }
         """
+        cached = catalog_cache.get(request)
+        if cached is not None:
+            return Response(cached)
+
         try:
-            product = Product.objects.get(pk=pk)
+            # Every change to the product, or to a category it is shown
+            # with, invalidates one of these
+            versions = catalog_cache.tag_versions(product_tag(int(pk)), CATEGORY_LIST_TAG)
+
+            product = product_queryset(request).get(pk=pk)
             serializer = ProductSerializer(product, context={'request': request})
+
+            catalog_cache.set(request, serializer.data, versions)
             return Response(serializer.data)
         except Exception as ex:
             return HttpResponseServerError(ex)
@@ -197,7 +326,7 @@ class Products(ViewSet):
         product.created_date = request.data["created_date"]
         product.location = request.data["location"]
 
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
         product.customer = customer
 
         product_category = ProductCategory.objects.get(pk=request.data["category_id"])
@@ -238,6 +367,14 @@ class Products(ViewSet):
         @apiName ListProducts
         @apiGroup Product
 
+        @apiParam {Number} category Category id; products in its subcategories are included
+        @apiParam {Number} quantity Only the given number of newest products
+        @apiParam {Number} number_sold Only products with at least this many units sold
+        @apiParam {String} cursor Opaque cursor from a previous page's next/previous link
+        @apiParam {Number} page_size Number of products per page (opts in to pagination)
+        @apiParam {String} fields Comma-separated dotted paths of the fields to return,
+            e.g. id,name,category.name; stats are only computed when requested
+
         @apiSuccess (200) {Object[]} products Array of products
         @apiSuccessExample {json} Success
             [
@@ -249,6 +386,7 @@ class Products(ViewSet):
                     "number_sold": 0,
                     "description": "It flies high",
                     "quantity": 60,
+                    "available": 60,
                     "created_date": "2019-10-23",
                     "location": "Pittsburgh",
                     "image_path": null,
@@ -259,16 +397,31 @@ class Products(ViewSet):
                     }
                 }
             ]
+        @apiError (400) {String} message Invalid filter
+        @apiError (400) {Object} errors Messages for each invalid query parameter
         """
-        products = Product.objects.all()
+        filters = ProductFilterSerializer(data=request.query_params)
+        if not filters.is_valid():
+            return Response({'message': 'Invalid product filter', 'errors': filters.errors},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        cached = catalog_cache.get(request)
+        if cached is not None:
+            return Response(cached)
 
         # Support filtering by category and/or quantity
-        category = self.request.query_params.get('category', None)
-        quantity = self.request.query_params.get('quantity', None)
+        category = filters.validated_data.get('category', None)
+        quantity = filters.validated_data.get('quantity', None)
         location = self.request.query_params.get('location', None)
         order = self.request.query_params.get('order_by', None)
         direction = self.request.query_params.get('direction', None)
-        number_sold = self.request.query_params.get('number_sold', None)
+        number_sold = filters.validated_data.get('number_sold', None)
+
+        # A category filter limits the list to that category's products
+        tag = category_tag(category) if category is not None else PRODUCT_LIST_TAG
+        versions = catalog_cache.tag_versions(tag)
+
+        products = product_queryset(request, ordering=order)
 
         if order is not None:
             order_filter = order
@@ -283,36 +436,425 @@ class Products(ViewSet):
             products = products.filter(location__contains=location)
 
         if category is not None:
-            products = products.filter(category__id=category)
-
-        if quantity is not None:
-            products = products.order_by("-created_date")[:int(quantity)]
+            products = products.filter(
+                category__in=ProductCategory.objects.subtree(category))
 
         if number_sold is not None:
-            def sold_filter(product):
-                if product.number_sold >= int(number_sold):
-                    return True
-                return False
+            products = products.sold_at_least(number_sold)
 
-            products = filter(sold_filter, products)
+        paginator = None
+        if quantity is not None:
+            products = products.order_by("-created_date")[:quantity]
+        else:
+            paginator = KeysetPagination(ordering_fields=('created_date', 'price'))
+            page = paginator.paginate_queryset(products, request, view=self)
+            if page is not None:
+                products = page
+            else:
+                paginator = None
 
         serializer = ProductSerializer(
             products, many=True, context={'request': request})
+
+        if paginator is not None:
+            response = paginator.get_paginated_response(serializer.data)
+        else:
+            response = Response(serializer.data)
+
+        catalog_cache.set(request, response.data, versions)
+        return response
+
+    @action(methods=['get'], detail=False)
+    def search(self, request):
+        """
+        @api {GET} /products/search?q= GET products matching a text query
+        @apiName SearchProducts
+        @apiGroup Product
+
+        @apiParam {String} q Words to look for in product names and descriptions
+        @apiParam {Number} limit Maximum number of results (default 20, max 100)
+
+        @apiSuccess (200) {Object[]} products Matching products, most relevant first
+        @apiSuccess (200) {Number} products.rank Relevance score of the match
+        @apiSuccessExample {json} Success
+            [
+                {
+                    "id": 101,
+                    "name": "Kite",
+                    "price": 14.99,
+                    "number_sold": 0,
+                    "description": "It flies high",
+                    "quantity": 60,
+                    "available": 60,
+                    "created_date": "2019-10-23",
+                    "location": "Pittsburgh",
+                    "image_path": null,
+                    "average_rating": 0,
+                    "category": {
+                        "id": 6,
+                        "name": "Games/Toys"
+                    },
+                    "rank": 2.77
+                }
+            ]
+        @apiError (400) {String} message Missing search query, or a limit that is not a number
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'message': 'The q query parameter is required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+        except ValueError:
+            return Response({'message': 'limit must be a whole number'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        products = search_products(
+            product_queryset(request), query, limit)
+
+        serializer = ProductSerializer(products, many=True, context={'request': request})
+        for product, data in zip(products, serializer.data):
+            data['rank'] = product.rank
+        return Response(serializer.data)
+
+    @action(methods=['get'], detail=True)
+    def related(self, request, pk=None):
+        """
+        @api {GET} /products/:id/related GET products customers also bought
+        @apiName GetRelatedProducts
+        @apiGroup Product
+
+        @apiParam {id} id Product Id route parameter
+        @apiParam {Number} limit Maximum number of results (default 10, max 50)
+
+        @apiSuccess (200) {Object[]} products Products most often on the same paid
+            orders, most often first
+        @apiSuccess (200) {Number} products.bought_together Number of paid orders
+            that had both products
+        @apiSuccessExample {json} Success
+            [
+                {
+                    "id": 33,
+                    "name": "DB9",
+                    "price": 1296.98,
+                    "number_sold": 4,
+                    "description": "2008 Aston Martin",
+                    "quantity": 2,
+                    "available": 2,
+                    "created_date": "2019-03-19",
+                    "location": "Vratsa",
+                    "image_path": null,
+                    "average_rating": 4.5,
+                    "category": {
+                        "id": 2,
+                        "name": "Auto"
+                    },
+                    "bought_together": 3
+                }
+            ]
+        """
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            limit = 10
+
+        try:
+            product_id = int(pk)
+        except ValueError:
+            return Response({'message': 'Product ids are numbers'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            related = copurchase_index.related(product_id, limit)
+        except (OSError, ValueError):
+            # An unreadable matrix means no suggestions, not a missing product
+            logger.exception("Could not read the co-purchase matrix")
+            related = []
+
+        # The ranking comes from the shared co-purchase matrix; only the
+        # products themselves are read from the database
+        found = product_queryset(request).in_bulk([product_id for product_id, _ in related])
+        products = [found[product_id] for product_id, _ in related if product_id in found]
+
+        serializer = ProductSerializer(products, many=True, context={'request': request})
+        counts = dict(related)
+        for product, data in zip(products, serializer.data):
+            data['bought_together'] = counts[product.id]
+        return Response(serializer.data)
+
+    @action(methods=['get'], detail=False, url_path='top-rated')
+    def top_rated(self, request):
+        """
+        @api {GET} /products/top-rated GET best rated products
+        @apiName GetTopRatedProducts
+        @apiGroup Product
+
+        @apiParam {id} category Only products in this category or its subcategories
+        @apiParam {Number} limit Maximum number of results (default 20, max 50)
+
+        @apiSuccess (200) {Object[]} products Rated products, best score first
+        @apiSuccess (200) {Number} products.score Average rating pulled towards the
+            catalog-wide prior, so products with few ratings do not outrank well
+            established ones
+        @apiSuccessExample {json} Success
+            [
+                {
+                    "id": 33,
+                    "name": "DB9",
+                    "price": 1296.98,
+                    "number_sold": 4,
+                    "description": "2008 Aston Martin",
+                    "quantity": 2,
+                    "available": 2,
+                    "created_date": "2019-03-19",
+                    "location": "Vratsa",
+                    "image_path": null,
+                    "average_rating": 4.5,
+                    "category": {
+                        "id": 2,
+                        "name": "Auto"
+                    },
+                    "score": 4.1
+                }
+            ]
+        """
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)),
+                               settings.LEADERBOARD_SIZE))
+        except ValueError:
+            limit = 20
+
+        category = request.query_params.get('category', None)
+        if category is not None:
+            try:
+                category = int(category)
+            except ValueError:
+                return Response({'message': 'Category ids are numbers'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        # Boards are kept up to date as ratings come in, so ranking is a
+        # short index scan; only the products themselves are read afterwards
+        ranked = list(LeaderboardEntry.objects.board(category)
+                      .values_list('product_id', 'score')[:limit])
+        found = product_queryset(request).in_bulk([product_id for product_id, _ in ranked])
+        products = [found[product_id] for product_id, _ in ranked if product_id in found]
+
+        serializer = ProductSerializer(products, many=True, context={'request': request})
+        scores = dict(ranked)
+        for product, data in zip(products, serializer.data):
+            data['score'] = round(scores[product.id], 2)
         return Response(serializer.data)
 
+    @action(methods=['get'], detail=False)
+    def export(self, request):
+        """
+        @api {GET} /products/export?type= GET the whole catalog as a stream
+        @apiName ExportProducts
+        @apiGroup Product
+
+        @apiParam {String} type ndjson (default) or csv
+        @apiParam {Number} category Category id; products in its subcategories are included
+
+        @apiSuccess (200) {Object} product One product per line, in id order
+        @apiSuccessExample {json} Success
+            {"id": 101, "name": "Kite", "price": 14.99, "number_sold": 0, "average_rating": 0, "description": "It flies high", "quantity": 60, "available": 60, "created_date": "2019-10-23", "location": "Pittsburgh", "category_id": 6, "customer_id": 7}
+        @apiError (400) {String} message Unsupported export type or invalid category
+        """
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in EXPORT_WRITERS:
+            return Response(
+                {'message': f'type must be one of: {", ".join(EXPORT_WRITERS)}'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        filters = CategoryFilterSerializer(data=request.query_params)
+        if not filters.is_valid():
+            return Response({'message': 'category must be a category id'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        products = Product.objects.with_stats().with_availability()
+
+        category = filters.validated_data.get('category', None)
+        if category is not None:
+            products = products.filter(
+                category__in=ProductCategory.objects.subtree(category))
+
+        rows = export_rows(products, settings.PRODUCT_EXPORT_CHUNK_SIZE)
+        response = StreamingHttpResponse(
+            EXPORT_WRITERS[export_type](rows), content_type=CONTENT_TYPES[export_type])
+        response['Content-Disposition'] = f'attachment; filename="products.{export_type}"'
+        return response
+
+    @action(methods=['post'], detail=False)
+    def bulk(self, request):
+        """
+        @api {POST} /products/bulk POST many new products at once
+        @apiName BulkCreateProducts
+        @apiGroup Product
+
+        @apiHeader {String} Authorization Auth token
+        @apiHeaderExample {String} Authorization
+            Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+        @apiHeader {String} Content-Type application/json for a JSON array of
+            products, or application/x-ndjson for one product per line
+
+        @apiParam {Number} chunk_size Products inserted per transaction (default 1000)
+        @apiParamExample {json} Input
+            [
+                {
+                    "name": "Kite",
+                    "price": 14.99,
+                    "description": "It flies high",
+                    "quantity": 60,
+                    "location": "Pittsburgh",
+                    "category_id": 4
+                }
+            ]
+
+        @apiSuccess (201) {Number} created Number of products created
+        @apiSuccess (201) {Number} failed Number of rows that were rejected
+        @apiSuccess (201) {Object[]} errors Validation errors keyed by row position
+        @apiSuccessExample {json} Success
+            {
+                "created": 1,
+                "failed": 1,
+                "errors": [
+                    {
+                        "row": 1,
+                        "errors": {
+                            "price": ["This field is required."]
+                        }
+                    }
+                ]
+            }
+        @apiError (400) {Object} report Same shape as above when no product was created
+        """
+        try:
+            chunk_size = int(request.query_params.get(
+                'chunk_size', settings.PRODUCT_IMPORT_CHUNK_SIZE))
+        except ValueError:
+            chunk_size = settings.PRODUCT_IMPORT_CHUNK_SIZE
+        chunk_size = max(1, min(chunk_size, settings.PRODUCT_IMPORT_MAX_CHUNK_SIZE))
+
+        # Read the raw body as it arrives instead of parsing it all into request.data
+        stream = request.stream or io.BytesIO()
+        if request.content_type.startswith('application/x-ndjson'):
+            rows = iter_ndjson(stream)
+        else:
+            rows = iter_json_array(stream)
+
+        customer = request.customer
+        report = ProductImport(customer, chunk_size).run(rows)
+
+        if report['created']:
+            return Response(report, status=status.HTTP_201_CREATED)
+        return Response(report, status=status.HTTP_400_BAD_REQUEST)
+
     @action(methods=['post'], detail=True)
     def recommend(self, request, pk=None):
-        """Recommend products to other users"""
+        """
+        @api {POST} /products/:id/recommend POST recommend a product to other users
+        @apiName RecommendProduct
+        @apiGroup Product
 
-        if request.method == "POST":
-            rec = Recommendation()
-            rec.recommender = Customer.objects.get(user=request.auth.user)
-            rec.customer = Customer.objects.get(user__id=request.data["recipient"])
-            rec.product = Product.objects.get(pk=pk)
+        @apiHeader {String} Authorization Auth token
+        @apiHeaderExample {String} Authorization
+            Token 9ba45f09651c5b0c404f37a2d2572c026c146611
 
-            rec.save()
+        @apiParam {id} id Product Id route parameter
+        @apiParam {Number[]} recipients User ids of the customers to recommend it to
+        @apiParam {Number} recipient A single recipient's user id, instead of recipients
+        @apiParamExample {json} Input
+            {
+                "recipients": [5, 6, 8]
+            }
+
+        @apiSuccessExample {json} Success
+            HTTP/1.1 204 No Content
+        @apiError (400) {String} message Recipients are not a list of distinct user ids,
+            or include the sender
+        @apiError (404) {String} message Product or recipients that do not exist
+        """
+
+        if request.method == "POST":
+            given = RecommendSerializer(data=request.data, context={'request': request})
+            if not given.is_valid():
+                return Response({'message': 'recipients must be a list of user ids',
+                                 'errors': given.errors},
+                                status=status.HTTP_400_BAD_REQUEST)
+            user_ids = set(given.validated_data['recipients'])
+
+            if not Product.objects.filter(pk=pk).exists():
+                return Response({'message': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+
+            customers = dict(Customer.objects.filter(
+                user__id__in=user_ids).values_list('user_id', 'pk'))
+            missing = sorted(user_ids - set(customers))
+            if missing:
+                return Response({'message': f'Recipients not found: {missing}'},
+                                status=status.HTTP_404_NOT_FOUND)
+
+            Recommendation.objects.bulk_create([
+                Recommendation(recommender=request.customer, customer_id=customer_id, product_id=pk)
+                for customer_id in customers.values()
+            ])
 
             return Response(None, status=status.HTTP_204_NO_CONTENT)
 
         return Response(None, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
+
+    @action(methods=['post'], detail=True)
+    def rate(self, request, pk=None):
+        """
+        @api {POST} /products/:id/rate POST rate a product
+        @apiName RateProduct
+        @apiGroup Product
+
+        @apiHeader {String} Authorization Auth token
+        @apiHeaderExample {String} Authorization
+            Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+        @apiParam {id} id Product Id route parameter
+        @apiParam {Number} rating Score from 0 to 5; rating a product again replaces
+            the earlier score
+        @apiParamExample {json} Input
+            {
+                "rating": 4
+            }
+
+        @apiSuccess (201) {Number} rating Score given
+        @apiSuccess (201) {Number} previous Score it replaced, null for a first rating
+            (200 is returned instead of 201 when a score was replaced)
+        @apiSuccess (201) {Number} average_rating Product's average rating afterwards
+        @apiSuccess (201) {Number} rating_count Number of customers who rated the product
+        @apiSuccessExample {json} Success
+            {
+                "rating": 4,
+                "previous": null,
+                "average_rating": 3.5,
+                "rating_count": 4
+            }
+        @apiError (400) {String} message Rating is not a whole number from 0 to 5
+        @apiError (404) {String} message Product not found
+        """
+        given = RateSerializer(data=request.data)
+        if not given.is_valid():
+            return Response({'message': 'rating must be a whole number from 0 to 5'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        rating = given.validated_data['rating']
+
+        if not Product.objects.filter(pk=pk).exists():
+            return Response({'message': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        previous = ProductRating.objects.rate(pk, request.customer.pk, rating)
+        stats = ProductStats.objects.get(product_id=pk)
+
+        return Response(
+            {
+                'rating': rating,
+                'previous': previous,
+                'average_rating': stats.average_rating,
+                'rating_count': stats.rating_count,
+            },
+            status=status.HTTP_201_CREATED if previous is None else status.HTTP_200_OK)
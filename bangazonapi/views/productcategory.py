@@ -5,16 +5,19 @@
 """
 
 """View module for handling requests about park areas"""
+from django.db.models import Count
 from django.http import HttpResponseServerError
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
 from bangazonapi.models import ProductCategory
+from bangazonapi.fieldsets import SparseFieldsMixin
+from bangazonapi.cache import catalog_cache, CATEGORY_LIST_TAG, PRODUCT_LIST_TAG
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 
 
-class ProductCategorySerializer(serializers.ModelSerializer):
+class ProductCategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for park areas
 
     Arguments:
@@ -22,7 +25,7 @@ class ProductCategorySerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = ProductCategory
-        fields = ('id', 'name')
+        fields = ('id', 'name', 'parent')
 
 
 class ProductCategories(ViewSet):
@@ -37,6 +40,12 @@ class ProductCategories(ViewSet):
         """
         new_product_category = ProductCategory()
         new_product_category.name = request.data["name"]
+        new_product_category.parent_id = request.data.get("parent_id", None)
+
+        if new_product_category.parent_id is not None and not ProductCategory.objects.filter(
+                pk=new_product_category.parent_id).exists():
+            return Response({'message': 'Parent category not found'},
+                            status=status.HTTP_400_BAD_REQUEST)
         new_product_category.save()
 
         serializer = ProductCategorySerializer(new_product_category, context={'request': request})
@@ -60,15 +69,39 @@ class ProductCategories(ViewSet):
         """Handle GET requests to park ProductCategorys resource
 
         Returns:
-            Response -- JSON serialized list of park ProductCategorys
+            Response -- JSON serialized tree of product categories, where each
+            node's product_count includes the products of its subcategories
         """
-        product_category = ProductCategory.objects.all()
+        cached = catalog_cache.get(request)
+        if cached is not None:
+            return Response(cached)
+
+        versions = catalog_cache.tag_versions(CATEGORY_LIST_TAG, PRODUCT_LIST_TAG)
 
-        # Support filtering ProductCategorys by area id
-        # name = self.request.query_params.get('name', None)
-        # if name is not None:
-        #     ProductCategories = ProductCategories.filter(name=name)
+        # One aggregate query counts the products filed directly under each
+        # category; the subtree totals are rolled up in memory below
+        product_category = ProductCategory.objects.annotate(
+            product_count=Count('products')).order_by('path', 'id')
 
         serializer = ProductCategorySerializer(
             product_category, many=True, context={'request': request})
-        return Response(serializer.data)
+
+        nodes = {}
+        for category, data in zip(product_category, serializer.data):
+            data['product_count'] = category.product_count
+            data['children'] = []
+            nodes[category.id] = (category, data)
+
+        roots = []
+        for category, data in nodes.values():
+            if category.parent_id in nodes:
+                nodes[category.parent_id][1]['children'].append(data)
+            else:
+                roots.append(data)
+
+            for ancestor_id in category.ancestor_ids[:-1]:
+                if ancestor_id in nodes:
+                    nodes[ancestor_id][1]['product_count'] += category.product_count
+
+        catalog_cache.set(request, roots, versions)
+        return Response(roots)
@@ -1,15 +1,55 @@
 """View module for handling requests about customer profiles"""
-import datetime
+from django.conf import settings
+from django.db import transaction
 from django.http import HttpResponseServerError
 from django.contrib.auth.models import User
 from rest_framework import serializers, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.viewsets import ViewSet
-from bangazonapi.models import Order, Customer, Product, OrderProduct, Favorite, Recommendation, product, recommendation
-from .product import ProductSerializer
-from .order import OrderSerializer
+from bangazonapi.models import Order, Customer, Product, OrderProduct, Favorite, Recommendation
+from bangazonapi.cache import invalidate_products
+from bangazonapi.feed import read_feed
+from bangazonapi.fieldsets import SparseFieldsMixin, field_requested
+from bangazonapi.pagination import KeysetPagination
+from .product import ProductSerializer, product_queryset
+from .cart import CartSerializer, get_cart
+
+
+def recommendation_limit(request):
+    """Number of recommendations to list in each direction on the profile"""
+    try:
+        limit = int(request.query_params['recommendation_limit'])
+    except (KeyError, ValueError):
+        return settings.PROFILE_RECOMMENDATION_LIMIT
+
+    return max(0, min(limit, settings.PROFILE_MAX_RECOMMENDATION_LIMIT))
+
+
+def profile_recommendations(request, customer):
+    """Recommendations made to and by a customer, each list in one query
+
+    Returns:
+        tuple -- Recommendations received and sent, newest first
+    """
+    limit = recommendation_limit(request)
+    recommendations = Recommendation.objects.none()
+    recommends = Recommendation.objects.none()
+
+    if field_requested(request, 'recommendations'):
+        recommendations = (
+            Recommendation.objects.filter(customer=customer)
+            .select_related('product', 'recommender__user').order_by('-id')[:limit]
+        )
+    if field_requested(request, 'recommends'):
+        recommends = (
+            Recommendation.objects.filter(recommender=customer)
+            .select_related('product', 'customer__user').order_by('-id')[:limit]
+        )
+    return recommendations, recommends
+
 
 class Profile(ViewSet):
     """Request handlers for user profile info in the Bangazon Platform"""
@@ -25,6 +65,9 @@ class Profile(ViewSet):
             @apiHeaderExample {String} Authorization
                 Token 9ba45f09651c5b0c404f37a2d2572c026c146611
 
+            @apiParam {Number} recommendation_limit Most recent recommendations to list
+                in each direction (default 50, at most 200)
+
             @apiSuccess (200) {Number} id Profile id
             @apiSuccess (200) {String} url URI of customer profile
             @apiSuccess (200) {Object} user Related user object
@@ -95,9 +138,11 @@ class Profile(ViewSet):
                 }
         """
         try:
-            current_user = Customer.objects.get(user=request.auth.user)
-            current_user.recommendations = Recommendation.objects.filter(customer=current_user)
-            current_user.recommends = Recommendation.objects.filter(recommender=current_user)
+            # The user comes with the customer from authentication, so the
+            # profile takes one query for payment types and one per list
+            current_user = request.customer
+            current_user.recommendations, current_user.recommends = \
+                profile_recommendations(request, current_user)
 
             serializer = ProfileSerializer(current_user, many=False, context={'request': request})
             return Response(serializer.data)
@@ -108,8 +153,6 @@ class Profile(ViewSet):
     def cart(self, request):
         """Shopping cart manipulation"""
 
-        current_user = Customer.objects.get(user=request.auth.user)
-
         if request.method == "DELETE":
             """
                 @api {DELETE} /profile/cart DELETE all line items in cart
@@ -125,10 +168,14 @@ class Profile(ViewSet):
                 @apiError (404) {String} message  Not found message.
             """
             try:
-                open_order = Order.objects.get(customer=current_user, payment_type=None)
-                line_items = OrderProduct.objects.filter(order=open_order)
-                line_items.delete()
-                open_order.delete()
+                with transaction.atomic():
+                    open_order = Order.objects.open().get(customer=request.customer)
+                    reserved = list(open_order.reservations.values_list('product_id', flat=True))
+                    line_items = OrderProduct.objects.filter(order=open_order)
+                    line_items.delete()
+                    open_order.delete()
+                    if reserved:
+                        invalidate_products(reserved)
             except Order.DoesNotExist as ex:
                 return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
 
@@ -150,9 +197,11 @@ class Profile(ViewSet):
                 @apiSuccess (200) {Object} payment_type Payment Id used to complete order
                 @apiSuccess (200) {String} customer URI for customer
                 @apiSuccess (200) {Number} size Number of items in cart
+                @apiSuccess (200) {Number} subtotal Summed price of the items in cart
                 @apiSuccess (200) {Object[]} line_items Line items in cart
                 @apiSuccess (200) {Number} line_items.id Line item id
                 @apiSuccess (200) {Object} line_items.product Product in cart
+                @apiSuccess (200) {Number} line_items.unit_price Price of one unit when it was added
                 @apiSuccessExample {json} Success
                     {
                         "id": 2,
@@ -182,25 +231,18 @@ class Profile(ViewSet):
                                 }
                             }
                         ],
-                        "size": 1
+                        "size": 1,
+                        "subtotal": 1296.98
                     }
                 @apiError (404) {String} message  Not found message
             """
             try:
-                open_order = Order.objects.get(customer=current_user, payment_type=None)
-                line_items = OrderProduct.objects.filter(order=open_order)
-                line_items = LineItemSerializer(line_items, many=True, context={'request': request})
-
-                cart = {}
-                cart["order"] = OrderSerializer(open_order, many=False, context={'request': request}).data
-                cart["order"]["line_items"] = line_items.data
-                cart["order"]["size"] = len(line_items.data)
-
-
+                open_order = get_cart(request)
             except Order.DoesNotExist as ex:
                 return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
 
-            return Response(cart["order"])
+            cart = CartSerializer(open_order, context={'request': request})
+            return Response(cart.data)
 
         if request.method == "POST":
             """
@@ -242,20 +284,15 @@ class Profile(ViewSet):
 
                 @apiError (404) {String} message  Not found message
             """
+            current_user = request.customer
 
-            try:
-                open_order = Order.objects.get(customer=current_user, payment_type=None)
-            except Order.DoesNotExist as ex:
-                open_order = Order()
-                open_order.created_date = datetime.datetime.now()
-                open_order.customer = current_user
-                open_order.save()
+            product = Product.objects.get(pk=request.data["product_id"])
 
-            line_item = OrderProduct()
-            line_item.product = Product.objects.get(
-                pk=request.data["product_id"])
-            line_item.order = open_order
-            line_item.save()
+            with transaction.atomic():
+                open_order = Order.objects.get_or_create_open(current_user)
+                OrderProduct.objects.add_to_order(open_order.id, {product.id: 1})
+
+            line_item = OrderProduct.objects.get(order=open_order, product=product)
 
             line_item_json = LineItemSerializer(line_item, many=False, context={'request': request})
 
@@ -311,15 +348,164 @@ class Profile(ViewSet):
                     }
                 ]
         """
-        customer = Customer.objects.get(user=request.auth.user)
+        customer = request.customer
         favorites = Favorite.objects.filter(customer=customer)
 
         serializer = FavoriteSerializer(
             favorites, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(methods=['get'], detail=False)
+    def feed(self, request):
+        """
+            @api {GET} /profile/feed GET new products from favorite sellers
+            @apiName GetFeed
+            @apiGroup UserProfile
+
+            @apiHeader {String} Authorization Auth token
+            @apiHeaderExample {String} Authorization
+                Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+            @apiParam {Number} before Only products with a lower id; taken from the next link
+            @apiParam {Number} page_size Number of products per page (default 20, max 100)
 
-class LineItemSerializer(serializers.ModelSerializer):
+            @apiSuccess (200) {String} next URL of the next page, or null
+            @apiSuccess (200) {Object[]} results Products, newest first
+            @apiSuccessExample {json} Success
+                {
+                    "next": "http://localhost:8000/profile/feed?before=97",
+                    "results": [
+                        {
+                            "id": 101,
+                            "name": "Kite",
+                            "price": 14.99,
+                            "number_sold": 0,
+                            "description": "It flies high",
+                            "quantity": 60,
+                            "available": 60,
+                            "created_date": "2019-10-23",
+                            "location": "Pittsburgh",
+                            "image_path": null,
+                            "average_rating": 0,
+                            "category": {
+                                "id": 6,
+                                "name": "Games/Toys"
+                            }
+                        }
+                    ]
+                }
+        """
+        try:
+            limit = max(1, min(int(request.query_params.get('page_size', 20)), 100))
+        except ValueError:
+            limit = 20
+        try:
+            before = int(request.query_params['before'])
+        except (KeyError, ValueError):
+            before = None
+
+        product_ids = read_feed(request.customer, before, limit)
+        has_more = len(product_ids) > limit
+        product_ids = product_ids[:limit]
+
+        found = product_queryset(request).in_bulk(product_ids)
+        products = [found[product_id] for product_id in product_ids if product_id in found]
+
+        next_link = None
+        if has_more:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), 'before', product_ids[-1])
+
+        serializer = ProductSerializer(products, many=True, context={'request': request})
+        return Response({'next': next_link, 'results': serializer.data})
+
+    @action(methods=['get', 'put'], detail=False)
+    def recommendations(self, request):
+        """Recommendation inbox"""
+
+        if request.method == "PUT":
+            """
+                @api {PUT} /profile/recommendations PUT mark recommendations as shown
+                @apiName MarkRecommendationsShown
+                @apiGroup UserProfile
+
+                @apiHeader {String} Authorization Auth token
+                @apiHeaderExample {String} Authorization
+                    Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+                @apiParam {Number[]} ids Recommendations to mark; every unseen one when left out
+                @apiParamExample {json} Input
+                    {
+                        "ids": [12, 15]
+                    }
+
+                @apiSuccess (200) {Number} updated Number of recommendations marked as shown
+                @apiError (400) {String} message ids is not a list of ids
+            """
+            unseen = Recommendation.objects.filter(customer=request.customer, is_shown=False)
+
+            marked = MarkShownSerializer(data=request.data)
+            if not marked.is_valid():
+                return Response({'message': 'ids must be a list of recommendation ids'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            if "ids" in marked.validated_data:
+                unseen = unseen.filter(pk__in=marked.validated_data["ids"])
+
+            return Response({'updated': unseen.update(is_shown=True)})
+
+        """
+            @api {GET} /profile/recommendations GET recommendations made to the user
+            @apiName GetRecommendationInbox
+            @apiGroup UserProfile
+
+            @apiHeader {String} Authorization Auth token
+            @apiHeaderExample {String} Authorization
+                Token 9ba45f09651c5b0c404f37a2d2572c026c146611
+
+            @apiParam {Boolean} shown true for recommendations already marked as shown
+                (default false, the unseen ones)
+            @apiParam {String} cursor Opaque cursor from a previous page's next/previous link
+            @apiParam {Number} page_size Number of recommendations per page
+
+            @apiSuccess (200) {Object[]} results Recommendations, newest first
+            @apiSuccessExample {json} Success
+                {
+                    "next": "http://localhost:8000/profile/recommendations?cursor=eyJmIjoi",
+                    "previous": null,
+                    "results": [
+                        {
+                            "id": 12,
+                            "product": {
+                                "id": 50,
+                                "name": "Escalade EXT"
+                            },
+                            "recommender": {
+                                "id": 7,
+                                "user": {
+                                    "first_name": "Brenda",
+                                    "last_name": "Long",
+                                    "email": "brenda@brendalong.com"
+                                }
+                            },
+                            "is_shown": false
+                        }
+                    ]
+                }
+        """
+        shown = request.query_params.get('shown', '').lower() in ('1', 'true')
+        recommendations = Recommendation.objects.filter(
+            customer=request.customer, is_shown=shown
+        ).select_related('product', 'recommender__user')
+
+        paginator = KeysetPagination(ordering_fields=('id',), default_ordering='-id', always=True)
+        page = paginator.paginate_queryset(recommendations, request, view=self)
+        serializer = InboxSerializer(page, many=True, context={'request': request})
+
+        return paginator.get_paginated_response(serializer.data)
+
+
+class LineItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for products
 
     Arguments:
@@ -328,10 +514,10 @@ class LineItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(many=False)
     class Meta:
         model = OrderProduct
-        fields = ('id', 'product')
+        fields = ('id', 'product', 'quantity', 'unit_price')
         depth = 1
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for customer profile
 
     Arguments:
@@ -342,20 +528,20 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('first_name', 'last_name', 'email')
         depth = 1
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for recommendation customers"""
     user = UserSerializer()
     class Meta:
         model = Customer
         fields = ('id', 'user',)
 
-class ProfileProductSerializer(serializers.ModelSerializer):
+class ProfileProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for products"""
     class Meta:
         model = Product
         fields = ('id', 'name',)
 
-class RecommendedSerializer(serializers.ModelSerializer):
+class RecommendedSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for recommendations"""
     recommender = CustomerSerializer()
     product = ProfileProductSerializer()
@@ -364,7 +550,18 @@ class RecommendedSerializer(serializers.ModelSerializer):
         fields = ('product', 'recommender',)
 
 
-class RecommenderSerializer(serializers.ModelSerializer):
+class MarkShownSerializer(serializers.Serializer):
+    """Validates the recommendations to mark as shown"""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+
+class InboxSerializer(RecommendedSerializer):
+    """JSON serializer for recommendations in the inbox"""
+    class Meta(RecommendedSerializer.Meta):
+        fields = ('id', 'product', 'recommender', 'is_shown',)
+
+
+class RecommenderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for recommendations"""
     customer = CustomerSerializer()
     product = ProfileProductSerializer()
@@ -374,7 +571,7 @@ class RecommenderSerializer(serializers.ModelSerializer):
 
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for customer profile
 
     Arguments:
@@ -392,7 +589,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         depth = 1
 
 
-class FavoriteUserSerializer(serializers.ModelSerializer):
+class FavoriteUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for favorite sellers user
 
     Arguments:
@@ -405,7 +602,7 @@ class FavoriteUserSerializer(serializers.ModelSerializer):
         depth = 1
 
 
-class FavoriteSellerSerializer(serializers.ModelSerializer):
+class FavoriteSellerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for favorite sellers
 
     Arguments:
@@ -421,7 +618,7 @@ class FavoriteSellerSerializer(serializers.ModelSerializer):
 
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for favorites
 
     Arguments:
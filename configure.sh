@@ -50,5 +50,10 @@ python manage.py loaddata order
 python manage.py loaddata order_product
 python manage.py loaddata favoritesellers
 python manage.py loaddata superuser
+python manage.py snapshot_order_totals
+python manage.py rebuild_product_stats
+python manage.py rebuild_leaderboards
+python manage.py build_copurchase
+python manage.py rebuild_feeds
 
 rm ./bangazonapi/fixtures/superuser.json